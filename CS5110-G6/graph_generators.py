@@ -0,0 +1,206 @@
+"""
+Random graph generators that build the CSR adjacency arrays directly with NumPy.
+
+networkx keeps a dict of dicts per node, which is slow to build and takes gigabytes at 10^6
+nodes, while the simulation only needs the CSR adjacency matrix. These generators draw the edges
+as arrays and return a CSRNetwork; call its to_networkx() when a networkx graph is needed.
+Every generator takes seed as anything np.random.default_rng accepts.
+
+    watts_strogatz_graph(n, k, p)   ring lattice with k neighbors, each edge rewired with prob. p
+    barabasi_albert_graph(n, m)     preferential attachment, m edges per new node
+    erdos_renyi_graph(n, p)         every pair is an edge with probability p
+    read_edge_list(path)            an edge list file such as the Facebook dataset
+"""
+import numpy as np
+import networkx as nx
+from scipy.sparse import coo_array, csr_array
+
+
+class CSRNetwork:
+    """A network given only by its CSR adjacency matrix (node i is row i). The simulation functions
+    accept it wherever they take a networkx graph, as they only use len(network) and network.graph."""
+
+    def __init__(self, indptr, indices, data=None):
+        if data is None:
+            data = np.ones(len(indices), dtype=np.int64)
+        self.graph = {"adjacency": csr_array((data, indices, indptr), shape=(len(indptr) - 1,) * 2)}
+
+    @classmethod
+    def from_edges(cls, sources, targets, num_nodes):
+        """The undirected simple network on num_nodes nodes with edges (sources[i], targets[i]).
+        Repeated edges are kept once."""
+        rows = np.concatenate((sources, targets))
+        cols = np.concatenate((targets, sources))
+        adjacency = coo_array((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(num_nodes, num_nodes)).tocsr()
+        adjacency.sum_duplicates()
+        adjacency.data[:] = 1
+        return cls(adjacency.indptr, adjacency.indices, adjacency.data)
+
+    def __len__(self):
+        return self.graph["adjacency"].shape[0]
+
+    def number_of_edges(self):
+        return self.graph["adjacency"].nnz // 2
+
+    def edges(self):
+        """(sources, targets) arrays with every edge once, source < target"""
+        adjacency = self.graph["adjacency"]
+        sources = np.repeat(np.arange(len(self)), np.diff(adjacency.indptr))
+        upper = sources < adjacency.indices
+        return sources[upper], adjacency.indices[upper]
+
+    def to_networkx(self):
+        """The same network as a networkx Graph"""
+        network = nx.Graph()
+        network.add_nodes_from(range(len(self)))
+        network.add_edges_from(zip(*(side.tolist() for side in self.edges())))
+        return network
+
+
+def complete_graph(n):
+    """The network joining every pair of the n nodes"""
+    sources, targets = np.triu_indices(n, 1)
+    return CSRNetwork.from_edges(sources, targets, n)
+
+
+def watts_strogatz_graph(n, k, p, seed=None, max_rounds=100):
+    """
+    Watts-Strogatz small world network, as nx.watts_strogatz_graph: every node is joined to its
+    k // 2 nearest neighbors on each side of a ring, then every edge (u, u + j) is rewired with
+    probability p to (u, w), w uniform among the nodes that are neither u nor already joined to u.
+
+    networkx rewires the edges one at a time; here every rewired edge draws its w at once, and the
+    draws that hit u, the old neighbor or an edge that is already there (or another draw) are drawn
+    again, for at most max_rounds rounds. Edges still without a free w are left in place, as
+    networkx does for a node joined to everyone; in such nearly complete networks an edge left in
+    place may join the same pair as a rewired one, and the two count as one edge.
+    """
+    if k > n:
+        raise ValueError("k > n, choose smaller k or larger n")
+    if k == n:
+        return complete_graph(n)
+    rng = np.random.default_rng(seed)
+    half = k // 2
+    sources = np.tile(np.arange(n), half)
+    lattice = (sources + np.repeat(np.arange(1, half + 1), n)) % n
+    targets = lattice.copy()
+
+    index = np.arange(len(sources))
+    pending = np.flatnonzero(rng.random(len(sources)) < p)
+    for _ in range(max_rounds):
+        if not len(pending):
+            break
+        targets[pending] = rng.integers(0, n, len(pending))
+        # Of the edges joining the same pair, one that is settled wins, else the first drawn
+        key = np.minimum(sources, targets) * n + np.maximum(sources, targets)
+        drawn = np.zeros(len(sources), dtype=bool)
+        drawn[pending] = True
+        order = np.lexsort((index, drawn, key))
+        repeated = np.zeros(len(sources), dtype=bool)
+        repeated[order[1:]] = key[order[1:]] == key[order[:-1]]
+        clash = repeated | (targets == sources) | (targets == lattice)
+        pending = pending[clash[pending]]
+    targets[pending] = lattice[pending]
+    return CSRNetwork.from_edges(sources, targets, n)
+
+
+def barabasi_albert_graph(n, m, seed=None):
+    """
+    Barabasi-Albert preferential attachment network, as nx.barabasi_albert_graph: starting from a
+    star on m + 1 nodes, every new node joins m distinct nodes picked with probability
+    proportional to their degree.
+
+    networkx picks from a list where every node appears once per edge end (repeated nodes), and
+    every new node appends its m targets and then itself m times, drawing until it has m distinct
+    targets. That list is laid out here as one array of slots: the place of every node's own
+    entries is known in advance, and a draw is a uniform pick among the slots before its node's
+    block. So every target slot points to an earlier slot and all targets are read off by pointer
+    jumping, in linear time. Each new node makes m + 1 draws up front (more when they hold fewer
+    than m distinct nodes) and takes the first m distinct ones; as a repeat depends on the
+    targets of earlier nodes, the slots are resolved again until no choice changes.
+    """
+    if m < 1 or m >= n:
+        raise ValueError(f"Barabasi-Albert network must have m >= 1 and m < n, m = {m}, n = {n}")
+    rng = np.random.default_rng(seed)
+    new_nodes = np.arange(m + 1, n)
+    # Slots: the star's 2m ends, then per new node s its m targets followed by m copies of s
+    size = 2 * m * (n - m)
+    block = 2 * m * (new_nodes - m)
+    target_slots = (block[:, None] + np.arange(m)).ravel()
+    value = np.empty(size, dtype=np.int64)
+    value[:2 * m] = np.concatenate((np.zeros(m, dtype=np.int64), np.arange(1, m + 1)))
+    value[(block[:, None] + m + np.arange(m)).ravel()] = np.repeat(new_nodes, m)
+
+    draws = (rng.random((len(new_nodes), m + 1)) * block[:, None]).astype(np.int64)
+    extra = {}  # row -> further draws of a node whose first m + 1 hold fewer than m distinct nodes
+    chosen = draws[:, :m].copy()
+    while True:
+        root = np.arange(size)
+        root[target_slots] = chosen.ravel()
+        active = target_slots
+        while len(active):
+            jumped = root[root[active]]
+            moved = jumped != root[active]
+            root[active] = jumped
+            active = active[moved]
+        resolved = value[root]
+
+        # Mark the first draw of every node in each row, then keep the first m of them
+        drawn = resolved[draws]
+        order = np.argsort(drawn, axis=1, kind="stable")
+        ranked = np.take_along_axis(drawn, order, axis=1)
+        first = np.ones(drawn.shape, dtype=bool)
+        first[:, 1:] = ranked[:, 1:] != ranked[:, :-1]
+        new = np.empty_like(first)
+        np.put_along_axis(new, order, first, axis=1)
+        found = np.cumsum(new, axis=1)
+        full = found[:, -1] >= m
+        following = chosen.copy()
+        following[full] = draws[full][(new & (found <= m))[full]].reshape(-1, m)
+        for row in np.flatnonzero(~full).tolist():
+            picked, seen, position = [], set(), 0
+            while len(picked) < m:
+                if position == len(draws[row]) + len(extra.setdefault(row, [])):
+                    extra[row].append(int(rng.random() * block[row]))
+                pick = draws[row, position] if position < len(draws[row]) else extra[row][position - len(draws[row])]
+                if resolved[pick] not in seen:
+                    seen.add(resolved[pick])
+                    picked.append(pick)
+                position += 1
+            following[row] = picked
+        if np.array_equal(following, chosen):
+            break
+        chosen = following
+
+    targets = resolved[target_slots]
+    sources = np.concatenate((np.zeros(m, dtype=np.int64), np.repeat(new_nodes, m)))
+    return CSRNetwork.from_edges(sources, np.concatenate((np.arange(1, m + 1), targets)), n)
+
+
+def erdos_renyi_graph(n, p, seed=None):
+    """
+    Erdos-Renyi G(n, p) network, as nx.erdos_renyi_graph: every pair of nodes is an edge with
+    probability p, independently. The number of edges is drawn from its binomial distribution,
+    then that many distinct pairs, numbered along the rows of the lower triangle, uniformly.
+    """
+    rng = np.random.default_rng(seed)
+    if p >= 1:
+        return complete_graph(n)
+    pairs = n * (n - 1) // 2
+    chosen = rng.choice(pairs, rng.binomial(pairs, max(p, 0.0)), replace=False, shuffle=False) if pairs else []
+    chosen = np.asarray(chosen, dtype=np.int64)
+    # Pair number c is (i, j) with j < i and c = i(i - 1)/2 + j; fix the rounding of the square root
+    rows = ((1 + np.sqrt(8 * chosen.astype(float) + 1)) // 2).astype(np.int64)
+    rows -= rows * (rows - 1) // 2 > chosen
+    rows += (rows + 1) * rows // 2 <= chosen
+    return CSRNetwork.from_edges(rows, chosen - rows * (rows - 1) // 2, n)
+
+
+def read_edge_list(path):
+    """The network of a whitespace separated edge list file, one 'node node' pair per line as in
+    the Facebook dataset. Nodes are renumbered 0.. in the order of their labels; self loops are dropped."""
+    edges = np.loadtxt(path, dtype=np.int64, ndmin=2, usecols=(0, 1))
+    labels, nodes = np.unique(edges, return_inverse=True)
+    nodes = nodes.reshape(edges.shape)
+    keep = nodes[:, 0] != nodes[:, 1]
+    return CSRNetwork.from_edges(nodes[keep, 0], nodes[keep, 1], len(labels))
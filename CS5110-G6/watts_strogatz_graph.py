@@ -1,10 +1,23 @@
+"""
+Prisoner's Dilemma on networks with payoff and popularity based imitation.
+
+Example:
+    python watts_strogatz_graph.py --networks watts_strogatz barabasi_albert --rewiring 0.1 0.5 -o sweep.npz
+
+Every cell of the grid (network, k, rewiring probability, strategy type, matrix, beta) runs
+num_simulations games together and its stats are printed. Each network is built once, in the
+main process, and its adjacency arrays are put in shared memory for the worker processes.
+All cooperation traces and stats end up in one .npz file, one entry per cell in each array.
+"""
+import argparse
+import os
+from multiprocessing import Pool, shared_memory
+
 import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
-import os
 
-# Create plots directory if it does not exist
-os.makedirs("plots", exist_ok=True)
+from graph_generators import CSRNetwork, barabasi_albert_graph, read_edge_list, watts_strogatz_graph
 
 # Parameters
 R1, S1, T1, P1 = 1.5, -0.3, 1.8, 0     # Payoffs for Prisoner's Dilemma M1
@@ -13,6 +26,7 @@ R2, S2, T2, P2 = 14.5, -0.5, 15, 0     # Payoffs for Prisoner's Dilemma M2
 beta_values = [0.1, 0.5]               # Selection intensities for payoff-based strategy
 num_nodes = 1000                       # Number of nodes for Watts-Strogatz Network
 k_values = [2, 6]                      # Average degree of network for Watts-Strogatz
+rewiring_values = [0.1]                # Rewiring probabilities for Watts-Strogatz
 popularity_factor = 22                 # Average edges per node in Facebook dataset
 timesteps = 100                        # Number of turns in each game
 num_simulations = 10                   # Number of simulations per condition
@@ -20,24 +34,108 @@ num_simulations = 10                   # Number of simulations per condition
 # Define the two payoff matrices
 M1 = np.array([[R1, S1], [T1, P1]])
 M2 = np.array([[R2, S2], [T2, P2]])
+MATRICES = {"M1": M1, "M2": M2}
 
 def initialize_strategy(num_nodes):
     """Randomly initialize strategy (1 for cooperate, 0 for defect)"""
     return np.random.choice([0, 1], num_nodes)
 
+def adjacency_matrix(network):
+    """CSR adjacency matrix of the network (node i is row i), built once and kept in network.graph"""
+    if "adjacency" not in network.graph:
+        network.graph["adjacency"] = nx.to_scipy_sparse_array(network, nodelist=range(len(network)),
+                                                               dtype=np.int64, format="csr")
+    return network.graph["adjacency"]
+
 def calculate_payoff(strategy, network, matrix):
-    """Calculate payoff for each node based on strategy and neighbors"""
-    payoff = np.zeros(len(strategy))
-    for i in network.nodes:
-        for j in network.neighbors(i):
-            payoff[i] += strategy[i] * matrix[0][strategy[j]] + (1 - strategy[i]) * matrix[1][strategy[j]]
-    return payoff
+    """Calculate payoff for each node based on strategy and neighbors.
+
+    Node i earns matrix[0][s_j] against each neighbor j if it plays 1 and matrix[1][s_j] if it
+    plays 0, so only the number of neighbors playing 1 (A @ strategy) and the degree matter.
+    strategy may also be a (replicas, nodes) matrix, whose rows are played independently with a
+    single sparse product.
+    """
+    adjacency = adjacency_matrix(network)
+    ones = (adjacency @ strategy.T).T
+    zeros = np.diff(adjacency.indptr) - ones
+    return (strategy * (ones * matrix[0][1] + zeros * matrix[0][0])
+            + (1 - strategy) * (ones * matrix[1][1] + zeros * matrix[1][0]))
 
 def fermi_function(payoff_i, payoff_j, beta):
     """Fermi function to model probability of strategy change"""
     return 1 / (1 + np.exp(-beta * (payoff_j - payoff_i)))
 
-def simulate_game(network, matrix, beta, strategy_type="payoff", timesteps=100):
+def neighbor_table(network):
+    """(offsets, neighbors, degree) of the network's CSR adjacency: the neighbors of node i are
+    neighbors[offsets[i]:offsets[i] + degree[i]]. Kept in network.graph next to the matrix."""
+    if "neighbor_table" not in network.graph:
+        adjacency = adjacency_matrix(network)
+        network.graph["neighbor_table"] = (adjacency.indptr[:-1], adjacency.indices, np.diff(adjacency.indptr))
+    return network.graph["neighbor_table"]
+
+def draw_uniform(rng, shape):
+    """Uniform numbers of the given shape. rng may be a list of generators, one per replica
+    (row), each drawing its own row, so the replicas have independent random streams."""
+    if isinstance(rng, (list, tuple)):
+        return np.stack([stream.random(shape[-1]) for stream in rng])
+    return rng.random(shape)
+
+def update_strategies(strategy, payoff, network, beta, strategy_type="payoff", mode="sequential", rng=np.random):
+    """One round of imitation: every node picks a random neighbor and copies its strategy with the
+    Fermi probability. Returns the new strategy array.
+
+    All random draws are made at once: the neighbor comes from one uniform number per node, and
+    the decision to copy only depends on the payoffs, which are fixed for the round.
+    mode "synchronous": every node copies the strategy its neighbor had at the start of the round.
+    mode "sequential": nodes update one after another in index order, as the original loop did,
+    so a node copies the strategy its neighbor has already taken this round if the neighbor comes
+    first. Following copies from a node to earlier neighbors ends at a node that copied a later
+    one (or nobody), whose new strategy it gets; the chains are followed by pointer jumping.
+    Nodes without neighbors keep their strategy.
+    strategy and payoff may also be (replicas, nodes) matrices, every row a separate game on the
+    same network, with rng a list of one generator per row (see draw_uniform).
+    This is plain NumPy with no compiled kernel, and it does not reach milliseconds per step at
+    10^6 nodes: a step on a 10^6 node ring lattice takes about 0.1 s, sequential a bit longer
+    than synchronous.
+    """
+    if mode not in ("synchronous", "sequential"):
+        raise ValueError(f"Unknown update mode {mode!r}")
+    offsets, neighbors, degree = neighbor_table(network)
+    if not len(neighbors):
+        return strategy.copy()
+    num_nodes = strategy.shape[-1]
+    picks = offsets + (draw_uniform(rng, strategy.shape) * degree).astype(offsets.dtype)
+    isolated = degree == 0
+    if isolated.any():
+        picks[..., isolated] = 0
+    neighbor = neighbors[picks]
+
+    # Determine beta based on strategy type
+    if strategy_type == "popularity":
+        beta = degree[neighbor] / (num_nodes - 1)
+    with np.errstate(over="ignore"):
+        switch = draw_uniform(rng, strategy.shape) < fermi_function(
+            payoff, np.take_along_axis(payoff, neighbor, axis=-1), beta)
+    if isolated.any():
+        switch &= ~isolated
+    nodes = np.arange(num_nodes)
+    source = np.where(switch, neighbor, nodes)
+    new_strategy = np.take_along_axis(strategy, source, axis=-1)
+    if mode == "synchronous":
+        return new_strategy
+
+    # Follow the chains on the flattened rows, each row offset by its start
+    row_start = np.arange(0, strategy.size, num_nodes).reshape(strategy.shape[:-1] + (1,))
+    root = (np.where(source < nodes, source, nodes) + row_start).ravel()
+    active = np.flatnonzero(root < np.arange(strategy.size))
+    while len(active):
+        jumped = root[root[active]]
+        moved = jumped != root[active]
+        root[active] = jumped
+        active = active[moved]
+    return new_strategy.ravel()[root].reshape(strategy.shape)
+
+def simulate_game(network, matrix, beta, strategy_type="payoff", timesteps=100, mode="sequential"):
     """Simulate the Prisoner's Dilemma game and record number of cooperators at each turn"""
     strategy = initialize_strategy(len(network))
     cooperator_counts = []
@@ -45,21 +143,32 @@ def simulate_game(network, matrix, beta, strategy_type="payoff", timesteps=100):
     for _ in range(timesteps):
         payoff = calculate_payoff(strategy, network, matrix)
         cooperator_counts.append(np.sum(strategy) / len(strategy))  # Record proportion of cooperators
-        
-        for i in network.nodes:
-            neighbor = np.random.choice(list(network.neighbors(i)))
-            
-            # Determine beta based on strategy type
-            if strategy_type == "popularity":
-                beta = network.degree[neighbor] / (len(network) - 1)
-            
-            if np.random.rand() < fermi_function(payoff[i], payoff[neighbor], beta):
-                strategy[i] = strategy[neighbor]  # Update strategy
+        strategy = update_strategies(strategy, payoff, network, beta, strategy_type, mode)
                 
     return cooperator_counts
 
+def simulate_replicas(network, matrix, beta, strategy_type="payoff", timesteps=100, num_simulations=10,
+                      mode="sequential", seed=None):
+    """Run num_simulations independent games on the same network at once, as a (num_simulations,
+    num_nodes) strategy matrix. Each replica gets its own random stream, spawned from seed.
+    seed may be an int or a np.random.SeedSequence.
+    Returns a (num_simulations, timesteps) array of the proportion of cooperators at each turn."""
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    streams = [np.random.default_rng(child) for child in seed.spawn(num_simulations)]
+    strategy = np.stack([stream.integers(0, 2, len(network)) for stream in streams])
+    cooperator_counts = np.empty((num_simulations, timesteps))
+
+    for t in range(timesteps):
+        payoff = calculate_payoff(strategy, network, matrix)
+        cooperator_counts[:, t] = strategy.mean(axis=1)
+        strategy = update_strategies(strategy, payoff, network, beta, strategy_type, mode, streams)
+
+    return cooperator_counts
+
 def plot_cooperation_trends(cooperator_counts_list, strategy_type, matrix_name, k, beta, timesteps, num_simulations):
     """Plot cooperation trends over time and save to a file"""
+    os.makedirs("plots", exist_ok=True)
     plt.figure()
     for sim, cooperator_counts in enumerate(cooperator_counts_list):
         plt.plot(range(timesteps), [count * 100 for count in cooperator_counts], alpha=0.3, label=f'Simulation {sim+1}' if sim == 0 else "")
@@ -74,24 +183,18 @@ def plot_cooperation_trends(cooperator_counts_list, strategy_type, matrix_name,
     plt.savefig(filename)
     plt.close()  # Close figure to free memory
 
+def cooperation_decay_stats(cooperator_counts_list):
+    """(average decay rate, mean percentage of cooperators, variance of that percentage) over the
+    simulations, given one row of cooperator proportions per simulation"""
+    counts = np.asarray(cooperator_counts_list, dtype=float)
+    decay_rates = (counts[:, 0] - counts[:, -1]) / counts.shape[1]
+    mean_cooperation_levels = counts.mean(axis=1) * 100  # Convert to percentage
+    return decay_rates.mean(), mean_cooperation_levels.mean(), mean_cooperation_levels.var()
+
 def calculate_cooperation_decay_stats(cooperator_counts_list, strategy_type, matrix_name, beta, k, num_simulations):
     """Calculate and display stats on the decay of cooperation over time with context."""
-    decay_rates = []
-    mean_cooperation_levels = []
-    
-    for cooperator_counts in cooperator_counts_list:
-        initial_cooperation = cooperator_counts[0]
-        final_cooperation = cooperator_counts[-1]
-        decay_rate = (initial_cooperation - final_cooperation) / len(cooperator_counts)
-        decay_rates.append(decay_rate)
-        
-        # Calculate mean percentage of cooperators for this simulation
-        mean_cooperation_levels.append(np.mean(cooperator_counts) * 100)  # Convert to percentage
-    
-    avg_decay_rate = np.mean(decay_rates)
-    mean_cooperation = np.mean(mean_cooperation_levels)
-    variance_cooperation = np.var(mean_cooperation_levels)
-    
+    avg_decay_rate, mean_cooperation, variance_cooperation = cooperation_decay_stats(cooperator_counts_list)
+
     # Print enhanced stats with context
     print(f"Stats for Strategy: {strategy_type.capitalize()}, Matrix: {matrix_name}, Beta: {beta}, k: {k}")
     print(f"  Number of Simulations: {num_simulations}")
@@ -99,28 +202,148 @@ def calculate_cooperation_decay_stats(cooperator_counts_list, strategy_type, mat
     print(f"  Mean percentage of cooperators: {mean_cooperation:.2f}%")
     print(f"  Variance in percentage of cooperators: {variance_cooperation:.4f}")
 
-# Run simulations and process results for each k value, matrix, and strategy type
-for strategy_type in ["payoff", "popularity"]:
-    for matrix, matrix_name in [(M1, "M1"), (M2, "M2")]:
-        for beta in beta_values:
+NETWORK_TYPES = ["watts_strogatz", "barabasi_albert", "facebook"]
+
+def build_network(network_type, num_nodes, k, rewiring, seed, edge_list=None):
+    """Build one network of the sweep as a CSRNetwork. Barabasi-Albert attaches every new node
+    with k edges; the Facebook network is read from edge_list and ignores the other parameters."""
+    if network_type == "watts_strogatz":
+        return watts_strogatz_graph(num_nodes, k, rewiring, seed=seed)
+    if network_type == "barabasi_albert":
+        return barabasi_albert_graph(num_nodes, k, seed=seed)
+    if network_type == "facebook":
+        if edge_list is None:
+            raise ValueError("The facebook network needs an edge list file")
+        return read_edge_list(edge_list)
+    raise ValueError(f"Unknown network type {network_type!r}")
+
+def share_network(network):
+    """Copy the CSR arrays of the network into shared memory blocks.
+    Returns (blocks, descriptor); pass the descriptor to attach_network."""
+    adjacency = adjacency_matrix(network)
+    blocks, descriptor = [], []
+    for array in (adjacency.indptr, adjacency.indices, adjacency.data):
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        descriptor.append((block.name, array.shape, array.dtype.str))
+    return blocks, tuple(descriptor)
+
+def attach_shared_block(name):
+    """Open an existing shared memory block without taking over its cleanup from the creator."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # before Python 3.13; pool workers share the creator's resource tracker
+        return shared_memory.SharedMemory(name=name)
+
+_attached_networks = {}  # descriptor -> (blocks, CSRNetwork), per worker process
+
+def attach_network(descriptor):
+    """The CSRNetwork over the shared arrays of share_network, attached once per process"""
+    if descriptor not in _attached_networks:
+        blocks = [attach_shared_block(name) for name, shape, dtype in descriptor]
+        arrays = [np.ndarray(shape, dtype, buffer=block.buf) for block, (name, shape, dtype) in zip(blocks, descriptor)]
+        _attached_networks[descriptor] = (blocks, CSRNetwork(*arrays))
+    return _attached_networks[descriptor][1]
+
+def run_cell(task):
+    """Run the simulations of one grid cell on a shared network; returns the cooperation array"""
+    descriptor, strategy_type, matrix_name, beta, timesteps, num_simulations, mode, seed = task
+    return simulate_replicas(attach_network(descriptor), MATRICES[matrix_name], beta, strategy_type,
+                             timesteps, num_simulations, mode, seed)
+
+def sweep(network_types, k_values, rewiring_values, strategy_types, matrix_names, betas, num_nodes=1000,
+          timesteps=100, num_simulations=10, mode="sequential", seed=None, edge_list=None, jobs=None):
+    """Run every cell of the grid and print its stats. Returns the results as a dict of arrays,
+    one entry per cell, with the cooperation traces in a (cells, num_simulations, timesteps) array.
+    k and rewiring are -1 and nan for the networks that do not use them."""
+    root = np.random.SeedSequence(seed)
+    network_seeds, cell_seeds = root.spawn(2)
+
+    # One network per (type, k, rewiring); the cells on it follow in the order of the old loop
+    keys = []
+    for network_type in network_types:
+        if network_type == "facebook":
+            keys.append((network_type, -1, np.nan))
+        else:
             for k in k_values:
+                for rewiring in (rewiring_values if network_type == "watts_strogatz" else [np.nan]):
+                    keys.append((network_type, k, rewiring))
+    cells = [(key, strategy_type, matrix_name, beta)
+             for key in keys for strategy_type in strategy_types for matrix_name in matrix_names for beta in betas]
 
-                # Choose a network to run with
-                # network = nx.barabasi_albert_graph(num_nodes, k)
-                network = nx.watts_strogatz_graph(num_nodes, k, 0.1)
-                
-                cooperator_counts_list = [
-                    simulate_game(network, matrix, beta, strategy_type=strategy_type, timesteps=timesteps)
-                    for _ in range(num_simulations)
-                ]
-                
-                # plot_cooperation_trends(cooperator_counts_list, strategy_type, matrix_name, k, beta, timesteps, num_simulations)
-                
-                calculate_cooperation_decay_stats(
-                    cooperator_counts_list,
-                    strategy_type=strategy_type,
-                    matrix_name=matrix_name,
-                    beta=beta,
-                    k=k,
-                    num_simulations=num_simulations
-                )
+    shared = {}
+    try:
+        for key, network_seed in zip(keys, network_seeds.spawn(len(keys))):
+            network_type, k, rewiring = key
+            network = build_network(network_type, num_nodes, k, rewiring, int(network_seed.generate_state(1)[0]),
+                                    edge_list)
+            shared[key] = share_network(network)
+
+        tasks = [(shared[key][1], strategy_type, matrix_name, beta, timesteps, num_simulations, mode, cell_seed)
+                 for (key, strategy_type, matrix_name, beta), cell_seed in zip(cells, cell_seeds.spawn(len(cells)))]
+        if jobs == 1 or len(tasks) < 2:
+            cooperation = list(map(run_cell, tasks))
+        else:
+            with Pool(jobs) as pool:
+                cooperation = pool.map(run_cell, tasks, chunksize=1)
+    finally:
+        for blocks, descriptor in shared.values():
+            for block in _attached_networks.pop(descriptor, ([], None))[0]:
+                block.close()
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    stats = []
+    for ((network_type, k, rewiring), strategy_type, matrix_name, beta), counts in zip(cells, cooperation):
+        label = network_type if network_type != "watts_strogatz" else f"{network_type}, rewiring {rewiring}"
+        print(f"Network: {label}")
+        calculate_cooperation_decay_stats(counts, strategy_type, matrix_name, beta, k, num_simulations)
+        stats.append(cooperation_decay_stats(counts))
+    stats = np.array(stats).reshape(len(cells), 3)
+    return {
+        "network": np.array([key[0] for key, *_ in cells]),
+        "k": np.array([key[1] for key, *_ in cells], dtype=np.int64),
+        "rewiring": np.array([key[2] for key, *_ in cells], dtype=float),
+        "strategy_type": np.array([cell[1] for cell in cells]),
+        "matrix": np.array([cell[2] for cell in cells]),
+        "beta": np.array([cell[3] for cell in cells], dtype=float),
+        "cooperation": np.array(cooperation).reshape(len(cells), num_simulations, timesteps),
+        "avg_decay_rate": stats[:, 0],
+        "mean_cooperation": stats[:, 1],
+        "variance_cooperation": stats[:, 2],
+        "entropy": np.array(str(root.entropy)),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep the Prisoner's Dilemma imitation game over networks and parameters.")
+    parser.add_argument('--networks', nargs='+', choices=NETWORK_TYPES, default=["watts_strogatz"],
+                        help="network types to sweep (default: watts_strogatz)")
+    parser.add_argument('--k', nargs='+', type=int, default=k_values,
+                        help="Watts-Strogatz degree, or edges per new Barabasi-Albert node")
+    parser.add_argument('--rewiring', nargs='+', type=float, default=rewiring_values,
+                        help="Watts-Strogatz rewiring probabilities")
+    parser.add_argument('--strategies', nargs='+', choices=["payoff", "popularity"], default=["payoff", "popularity"])
+    parser.add_argument('--matrices', nargs='+', choices=list(MATRICES), default=list(MATRICES))
+    parser.add_argument('--betas', nargs='+', type=float, default=beta_values, help="selection intensities")
+    parser.add_argument('--nodes', type=int, default=num_nodes, help="nodes of the generated networks")
+    parser.add_argument('--timesteps', type=int, default=timesteps, help="turns in each game")
+    parser.add_argument('--simulations', type=int, default=num_simulations, help="games per cell")
+    parser.add_argument('--mode', choices=["sequential", "synchronous"], default="sequential",
+                        help="order of the strategy updates within a turn")
+    parser.add_argument('--edge-list', help="edge list file of the Facebook network")
+    parser.add_argument('--seed', type=int, default=None, help="seed of the whole sweep (default: random)")
+    parser.add_argument('--output', '-o', default="sweep_results.npz", help="results file (default: sweep_results.npz)")
+    parser.add_argument('--jobs', '-j', type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+    if "facebook" in args.networks and not args.edge_list:
+        parser.error("the facebook network needs --edge-list")
+
+    results = sweep(args.networks, args.k, args.rewiring, args.strategies, args.matrices, args.betas, args.nodes,
+                    args.timesteps, args.simulations, args.mode, args.seed, args.edge_list, args.jobs)
+    np.savez_compressed(args.output, **results)
+
+
+if __name__ == '__main__':
+    main()
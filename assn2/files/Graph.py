@@ -3,87 +3,54 @@ Originally written by Vicki Allan using Bellman-Ford pseudocode.
 Modified by Nathan Bal to experiment with different implementations of the min-cost max-flow algorithm 
 to find a centralized matching solution in the context of applicants and employers.
 """
+import heapq
+from collections import deque
+
+import numpy
+
 import matches
 
 class Graph:
 
-    # An input edge has three components (startNode, endNode, ranking).
-    # This creates a combined edge (startNode, endNode, ranking,possibleFLow).  Our possible flow is 1.
-    # We should have two edges: one from a->b indicate preference for men and women.
-    # If we don't have two edges, one partner found the other unacceptable, so we can ignore that combination
-    def combine(self, edge1, edge2):
-        if (edge1[0] == edge2[0] and edge1[1] == edge2[1]):
-            return (self.vertices.index(edge1[0]), self.vertices.index(edge1[1]), edge1[2] + edge2[2], 1)
-        else:
-            return None
-
     # for our matching, we consider the cost of an edge to be the sum of costs for each partner.
-    # In this method, we combine individual edges  (from our input rankings) creating a new set of edges.
-    def combine_edges(self, edges):
-        new_edges = []
-        i = 0
-
-        while i + 1 < len(edges):
-            e = self.combine(edges[i], edges[i + 1])
-            if e is not None:
-                new_edges.append(e)
-                i += 2
-            else:
-                i += 1  # skip the edge without a match
-        return new_edges
+    # Only pairs where both partners list each other get an edge; otherwise one partner found the
+    # other unacceptable, so we can ignore that combination. Ranks are 1 based, so a pair of first
+    # choices costs 2. Vertices are numbered Source, proposers, acceptors, Sink.
+    def combine_edges(self, market):
+        proposerCt = len(market.proposerNames)
+        owner = numpy.repeat(numpy.arange(proposerCt), numpy.diff(market.indptr))
+        acceptable = market.entryRank < proposerCt
+        cost = market.position + market.entryPosition + 2
+        return list(zip((owner[acceptable] + 1).tolist(),
+                        (market.indices[acceptable] + proposerCt + 1).tolist(),
+                        cost[acceptable].tolist(),
+                        [1] * int(acceptable.sum())))
 
     def create_graph(self, file_tuple):
-        self.vertices.append("Source")  # create a list of all vertices
-        with open(file_tuple[0]) as f:
-            for line in f:
-                pieces = line.split(':')
-                name = pieces[0].strip()
-                self.vertices.append(name)
-
-                if name:
-                    priorities = pieces[1].strip().split(',')
-                    for i in range(len(priorities)):
-                        priorities[i] = priorities[i].strip()
-                        # create an edge a->b with cost and flow
-                        self.edges.append((name, priorities[i], i + 1, 1))
-            f.close()
-        proposerCt = len(self.vertices) - 1
-        # repeat for other file preferences,  Notice, I switch the order of the nodes, so the proposer is always first.
-        with open(file_tuple[1]) as f:
-            for line in f:
-                pieces = line.split(':')
-                name = pieces[0].strip()
-                self.vertices.append(name)
-
-
-                if name:
-                    priorities = pieces[1].strip().split(',')
-                    for i in range(len(priorities)):
-                        priorities[i] = priorities[i].strip()
-                        # create an edge a->b with cost and flow
-                        self.edges.append((priorities[i], name, i + 1, 1))
-            f.close()
-        self.vertices.append("Sink")
-        # Sort edges to get those with same to/from nodes together
-        self.edges.sort()
-        self.edges = self.combine_edges(self.edges)
+        # the proposer is always the first file, so proposer nodes come before acceptor nodes
+        market = matches.loadMarket(file_tuple[0], file_tuple[1])
+        self.vertices = ["Source"] + market.proposerNames + market.acceptorNames + ["Sink"]
+        proposerCt = self.proposerCt = len(market.proposerNames)
+        self.edges = self.combine_edges(market)
         sink = len(self.vertices) - 1
 
-        # set up edges as max flow problem
+        # set up edges as max flow problem; each person can take as many partners as their quota
         for p in range(1, proposerCt + 1):
-            self.edges.append((0, p, 0, 1))
+            self.edges.append((0, p, 0, int(market.proposerQuota[p - 1])))
         for a in range(proposerCt + 1, sink):
-            self.edges.append((a, sink, 0, 1))
+            self.edges.append((a, sink, 0, int(market.acceptorQuota[a - proposerCt - 1])))
         self.make_adjacency()
 
-    # from the list of edges, create an adjacency matrix, residual matrix, and cost_matrix
+    # from the list of edges, create adjacency lists over a flat edge array. Every input edge
+    # u->v is stored at an even index e with its residual capacity and cost, and its reverse
+    # v->u right after it at e ^ 1, with no capacity and the negated cost. Pushing flow along e
+    # moves capacity from e to e ^ 1.
     def make_adjacency(self):
         self.vertex_ct = len(self.vertices)
-        self.adjM = []
-        while (len(self.adjM) < self.vertex_ct):
-            temp = [0 for i in range(self.vertex_ct)]
-            self.adjM.append(temp)
-        self.cost_array = [list(row) for row in self.adjM]  # careful to get a deep copy
+        self.adjacency = [[] for i in range(self.vertex_ct)]  # edge indices leaving each vertex
+        self.head = []  # vertex each edge points to
+        self.capacity = []  # residual capacity of each edge
+        self.cost = []
 
         for edge in self.edges:
             i = int(edge[0])
@@ -92,16 +59,23 @@ class Graph:
             if i >= self.vertex_ct or j >= self.vertex_ct or i < 0 or j < 0:
                 print(f"Not a Proper Input in Edge {i},{j}")
             else:
-                self.adjM[i][j] = edge[3]
-                self.cost_array[i][j] = edge[2]
-                self.cost_array[j][i] = -edge[2]
-            self.residual = [list(row) for row in self.adjM]  # careful to get a deep copy
+                self.adjacency[i].append(len(self.head))
+                self.head.append(j)
+                self.capacity.append(edge[3])
+                self.cost.append(edge[2])
+                self.adjacency[j].append(len(self.head))
+                self.head.append(i)
+                self.capacity.append(0)
+                self.cost.append(-edge[2])
 
     # Executes the min-cost max-flow algorithm to find optimal matches 
     # between employers and applicants based on their preferences. The 
-    # function uses the Bellman-Ford algorithm to identify augmenting paths 
-    # in the residual graph, calculates the maximum flow, and accumulates 
-    # the total cost associated with the matches.
+    # function repeatedly augments along cheapest paths in the residual graph,
+    # calculates the maximum flow, and accumulates the total cost associated with the matches.
+    # Bellman-Ford runs once to set vertex potentials; after that the cheapest paths are found
+    # by Dijkstra on costs reduced by the potentials, which are never negative. Every path made
+    # of edges with zero reduced cost is then a cheapest path, so each search is followed by
+    # pushing as much flow as possible along such paths before searching again.
     def do_flow(self, msg, fileTuple):
         max_flow = 0
         total_cost = 0
@@ -110,74 +84,162 @@ class Graph:
 
         print("\n\n------- Min-cost Max-flow Algorithm -------")
         print(msg+" working with files ", fileTuple)
-        
-        while self.BellmanFord(source, sink):
-            flow = float('Inf')
-            v = sink
-            
-            while v != source:
-                u = self.pred[v]
-                flow = min(flow, self.residual[u][v])
-                v = u
-            
-            v = sink
-            while v != source:
-                u = self.pred[v]
-                self.residual[u][v] -= flow
-                self.residual[v][u] += flow
-                total_cost += flow * self.cost_array[u][v] 
-                v = u
-            
-            max_flow += flow
+
+        dist = self.BellmanFord(source)
+        # vertices out of reach now stay out of reach, so their potential never matters
+        self.potential = [d if d != float('Inf') else 0 for d in dist]
+        while self.Dijkstra(source, sink):
+            level = self.tight_levels(source, sink)
+            while level[sink] >= 0:
+                flow, cost = self.push_tight_flow(source, sink, level)
+                max_flow += flow
+                total_cost += cost
+                level = self.tight_levels(source, sink)
         
         print(f"Max flow: {max_flow}, Min cost: {total_cost}")
         self.find_matches()
+        return max_flow, total_cost
+
+    # Breadth first search from src over tight residual edges, those with zero reduced cost.
+    # Returns the number of edges on the shortest such path to each vertex, or -1 for vertices
+    # that cannot be reached. Vertices beyond the sink's level are never needed, so the search
+    # stops there.
+    def tight_levels(self, src, sink):
+        head, capacity, cost, potential = self.head, self.capacity, self.cost, self.potential
+        level = [-1] * self.vertex_ct
+        level[src] = 0
+        queue = deque([src])
+        while queue:
+            u = queue.popleft()
+            if level[sink] >= 0 and level[u] >= level[sink]:
+                break
+            reduced = potential[u]
+            for e in self.adjacency[u]:
+                v = head[e]
+                if level[v] < 0 and capacity[e] > 0 and cost[e] + reduced == potential[v]:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level
+
+    # Pushes a blocking flow from src to sink along tight edges that go one level further, as in
+    # Dinic's algorithm. next_edge remembers, for each vertex, how far through its edges the
+    # search got, so no edge is tried twice. Returns the flow pushed and its cost.
+    def push_tight_flow(self, src, sink, level):
+        head, capacity, cost, potential = self.head, self.capacity, self.cost, self.potential
+        next_edge = [0] * self.vertex_ct
+        total_flow = 0
+        total_cost = 0
+        path = []  # edges from src to u
+        u = src
+        while True:
+            if u == sink:
+                flow = min(capacity[e] for e in path)
+                for e in path:
+                    capacity[e] -= flow
+                    capacity[e ^ 1] += flow
+                    total_cost += flow * cost[e]
+                total_flow += flow
+                path = []
+                u = src
+                continue
+
+            edges = self.adjacency[u]
+            i = next_edge[u]
+            while i < len(edges):
+                e = edges[i]
+                v = head[e]
+                if level[v] == level[u] + 1 and capacity[e] > 0 and cost[e] + potential[u] == potential[v]:
+                    break
+                i += 1
+            next_edge[u] = i
+            if i < len(edges):
+                path.append(e)
+                u = v
+            elif u == src:
+                return total_flow, total_cost
+            else:
+                # dead end: step back and never come here again in this pass
+                level[u] = -1
+                e = path.pop()
+                u = head[e ^ 1]
+                next_edge[u] += 1
 
     # Identifies and displays the final matchings between employers and 
     # applicants based on the results of the min-cost max-flow algorithm. 
     def find_matches(self):
-        proposerCt = len(self.vertices) // 2 - 1 
         sink = len(self.vertices) - 1
 
         print("Final Pairings are as follows:")
-        for employer in range(1, proposerCt + 1):
-            for applicant in range(proposerCt + 1, sink):
-                # If there is flow from employer to applicant, it indicates a match
-                if self.residual[applicant][employer] == 1:
-                    print(f"Employer {self.vertices[employer]} matched with Applicant {self.vertices[applicant]}")
-
-    # Finds shortest distances from src to
-    # all other vertices using Bellman-Ford algorithm. We assume no negative weight cycles
-    # We are interested in the path from the src to the sink.
-    # If we never make it to the sink, there is no flow
-    # return true if there is flow from src to sink.
-    def BellmanFord(self, src, sink):
-
-        # Step 1: Initialize distances from src to all other vertices
-        # as INFINITE
-        dist = [9999 for i in range(self.vertex_ct)]  # dist/cost to each node
-        pred = [-1 for i in range(self.vertex_ct)]  # predecessor of each node
+        for employer in range(1, self.proposerCt + 1):
+            # If an edge from employer to applicant is used up, there is flow, which indicates a match
+            for applicant in sorted(self.head[e] for e in self.adjacency[employer]
+                                    if e % 2 == 0 and self.capacity[e] == 0 and self.head[e] != sink):
+                print(f"Employer {self.vertices[employer]} matched with Applicant {self.vertices[applicant]}")
+
+    # Finds shortest distances from src to all other vertices in the residual graph using the
+    # queue based form of Bellman-Ford, which only relaxes edges leaving vertices whose distance
+    # just improved. We assume no negative weight cycles. Unreachable vertices get infinity.
+    def BellmanFord(self, src):
+        dist = [float('Inf')] * self.vertex_ct
         dist[src] = 0
+        queue = deque([src])
+        queued = [False] * self.vertex_ct
+        queued[src] = True
+        while queue:
+            u = queue.popleft()
+            queued[u] = False
+            for e in self.adjacency[u]:
+                v = self.head[e]
+                if self.capacity[e] > 0 and dist[u] + self.cost[e] < dist[v]:
+                    dist[v] = dist[u] + self.cost[e]
+                    if not queued[v]:
+                        queued[v] = True
+                        queue.append(v)
+        return dist
 
-        # Step 2: Relax all edges |V| - 1 times. A simple shortest
-        # path from src to any other vertex can have at-most |V| - 1
-        # edges
-        for _ in range(self.vertex_ct - 1):
-            for u in range(self.vertex_ct):
-                for v in range(self.vertex_ct):
-                    if self.residual[u][v] > 0 and dist[u] != 9999 and dist[u] + self.cost_array[u][v] < dist[v]:
-                        dist[v] = dist[u] + self.cost_array[u][v]
-                        pred[v] = u
-        self.pred = pred
-        return pred[sink] >= 0
+    # Finds a cheapest path from src to sink with Dijkstra, using costs reduced by the vertex
+    # potentials: cost + potential[u] - potential[v] is never negative on a residual edge.
+    # The search stops once the sink is settled. Potentials are then raised by the distances
+    # found, capped at the sink's, which keeps the reduced costs non negative after augmenting.
+    # Returns true if there is flow from src to sink.
+    def Dijkstra(self, src, sink):
+        head, capacity, cost, potential = self.head, self.capacity, self.cost, self.potential
+        dist = {src: 0}
+        settled = set()
+        heap = [(0, src)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            if u == sink:
+                break
+            for e in self.adjacency[u]:
+                if capacity[e] > 0:
+                    v = head[e]
+                    nd = d + cost[e] + potential[u] - potential[v]
+                    if nd < dist.get(v, nd + 1):
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+
+        if sink not in settled:
+            return False
+        # Raising every potential by the same amount changes no reduced cost, so only the
+        # settled vertices need touching
+        limit = dist[sink]
+        for v in settled:
+            potential[v] += dist[v] - limit
+        return True
 
     def __init__(self, fileTuple):
         self.vertices = []
-        self.adjM = []
         self.vertex_ct = 0
+        self.proposerCt = 0
         self.edges = []
-        self.residual = []
-        self.cost_array = []
+        self.adjacency = []
+        self.head = []
+        self.capacity = []
+        self.cost = []
         self.create_graph(fileTuple)
 
 files = [("Employers1.txt","Applicants1.txt", False),
@@ -189,8 +251,16 @@ files = [("Employers1.txt","Applicants1.txt", False),
          ("Employers4.txt","Applicants4.txt", False),
          ("Applicants4.txt", "Employers4.txt", False) ]
 
-for i in range(0, len(files), 2):
-    matches.doStableMatch("Empolyers Proposing:", files[i])
-    matches.doStableMatch("Applicants Proposing:", files[i+1])
-    g=Graph(files[i])
-    g.do_flow("Empolyers Proposing:", files[i])
\ No newline at end of file
+# employers hiring several applicants
+quota_files = [("EmployersQuota1.txt", "Applicants1.txt", False)]
+
+if __name__ == '__main__':
+    for i in range(0, len(files), 2):
+        matches.doStableMatch("Empolyers Proposing:", files[i])
+        matches.doStableMatch("Applicants Proposing:", files[i+1])
+        g=Graph(files[i])
+        g.do_flow("Empolyers Proposing:", files[i])
+
+    for file_tuple in quota_files:
+        matches.doCapacitatedMatch("Employers with quotas proposing:", file_tuple)
+        Graph(file_tuple).do_flow("Employers with quotas proposing:", file_tuple)
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+The centralized matching of Graph.py solved as an assignment problem.
+
+With unit capacities, min-cost max-flow from employers to applicants is a rectangular
+assignment problem: pick pairs, at most one per row and column, that are as many as possible
+and then as cheap as possible. A pair costs the summed ranks of Graph.combine_edges, and pairs
+where one side does not list the other are forbidden. Forbidden pairs get a sentinel cost larger
+than any complete assignment of real pairs, so an optimal assignment only uses one when no real
+pair is left for that row, and those are dropped afterwards.
+
+Two solvers are provided:
+  hungarian: Jonker-Volgenant shortest augmenting paths (scipy's linear_sum_assignment)
+  auction: Bertsekas' auction with epsilon scaling on the allowed pairs only, every free
+    bidder bidding at once
+"""
+import numpy
+from scipy.optimize import linear_sum_assignment
+
+import matches
+
+
+def cost_matrix(market):
+    """
+    cost[p][a] for proposer p and acceptor a of a matches.Market: the sum of the 1 based ranks
+    they give each other, or the sentinel when either one does not list the other.
+    Returns (cost, sentinel).
+    """
+    proposerCt, acceptorCt = len(market.proposerNames), len(market.acceptorNames)
+    owner = numpy.repeat(numpy.arange(proposerCt), numpy.diff(market.indptr))
+    acceptable = market.entryRank < proposerCt
+    ranks = market.position + market.entryPosition + 2
+
+    # Leaving a row unmatched must cost more than any set of real pairs could save
+    sentinel = float(ranks[acceptable].max(initial=0)) * min(proposerCt, acceptorCt) + 1
+    cost = numpy.full((proposerCt, acceptorCt), sentinel)
+    cost[owner[acceptable], market.indices[acceptable]] = ranks[acceptable]
+    return cost, sentinel
+
+
+def hungarian(cost, sentinel):
+    """Optimal assignment with Jonker-Volgenant. Returns the (rows, cols) of the real pairs."""
+    rows, cols = linear_sum_assignment(cost)
+    real = cost[rows, cols] < sentinel
+    return rows[real], cols[real]
+
+
+def auction(cost, sentinel):
+    """
+    Optimal assignment with the auction algorithm. Returns the (rows, cols) of the real pairs.
+
+    Bidders and objects only share arcs where a pair is allowed, so forbidden pairs cost
+    nothing. To keep the problem square and feasible, every row also gets a private "unmatched"
+    object worth -sentinel, and every column a stand-in bidder, which takes the column when it
+    stays unmatched or else the unmatched object of the row holding it (both worth 0).
+
+    Free bidders bid for their most valuable object, raising its price by the margin over
+    their second best object plus epsilon, and every object goes to its highest bidder. All free
+    bidders bid in the same round, so a round is a few array operations over their arcs. Epsilon
+    starts large and is divided by 4 between auctions, keeping the prices, until it drops below
+    1 / n; with integer costs the assignment is then optimal.
+    """
+    rowCt, colCt = cost.shape
+    rows, cols = numpy.nonzero(cost < sentinel)
+    if not len(rows):
+        return rows, cols
+    n = rowCt + colCt
+    # Bidders are the rows, then the columns' stand-ins; objects are the columns, then the
+    # rows' unmatched objects. Arcs: allowed pairs, each row's own unmatched object, each
+    # stand-in's own column, and the stand-in of column c to the unmatched object of each row
+    # that may take c.
+    bidder = numpy.concatenate((rows, numpy.arange(rowCt), rowCt + numpy.arange(colCt), rowCt + cols))
+    item = numpy.concatenate((cols, colCt + numpy.arange(rowCt), numpy.arange(colCt), colCt + rows))
+    value = numpy.concatenate((-cost[rows, cols], numpy.full(rowCt, -sentinel), numpy.zeros(colCt + len(rows))))
+    order = numpy.argsort(bidder, kind='stable')
+    item, value = item[order], value[order]
+    start = numpy.zeros(n + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(bidder, minlength=n), out=start[1:])
+
+    prices = numpy.zeros(n)
+    span = float(numpy.ptp(value))
+    # Prices only need to move by the spread of the real costs; the sentinel just has to be larger
+    epsilon = max(float(numpy.ptp(cost[rows, cols])) / 4, 1.0)
+    rng = numpy.random.default_rng(0)
+    while True:
+        won = _auction_round(start, item, value, prices, epsilon, span, rng)
+        if epsilon < 1.0 / n:
+            break
+        epsilon /= 4
+
+    cols = won[:rowCt]
+    real = numpy.flatnonzero(cols < colCt)
+    return real, cols[real]
+
+
+def _auction_round(start, item, value, prices, epsilon, span, rng):
+    """
+    One auction from an empty assignment at a fixed epsilon, on arcs stored by bidder:
+    bidder b may take item[start[b]:start[b + 1]], worth value[...]. Updates prices in place
+    and returns the object won by each bidder. A bidder torn between equally good objects picks
+    one at random, so bidders with the same options spread out instead of all bidding for one.
+    """
+    n = len(start) - 1
+    won = numpy.full(n, -1)
+    owner = numpy.full(n, -1)
+    free = numpy.arange(n)
+    while len(free):
+        # Gather the arcs of the free bidders
+        degrees = start[free + 1] - start[free]
+        first = numpy.cumsum(degrees) - degrees
+        arcs = numpy.repeat(start[free] - first, degrees) + numpy.arange(degrees.sum())
+        gains = value[arcs] - prices[item[arcs]]
+
+        top = numpy.maximum.reduceat(gains, first)
+        ties = numpy.where(gains == numpy.repeat(top, degrees), rng.random(len(arcs)), -1.0)
+        pick = numpy.maximum.reduceat(ties, first)
+        best = numpy.flatnonzero(ties == numpy.repeat(pick, degrees))
+        best = best[numpy.searchsorted(best, first)]
+        gains[best] = -numpy.inf
+        second = numpy.maximum.reduceat(gains, first)
+        # A bidder with a single arc has no second choice; let it outbid anyone
+        second = numpy.where(numpy.isneginf(second), top - span - 1, second)
+        targets = item[arcs[best]]
+        bids = prices[targets] + top - second + epsilon
+
+        # The highest bid for each object wins it
+        order = numpy.lexsort((bids, targets))
+        last = numpy.append(targets[order][1:] != targets[order][:-1], True)
+        winners = order[last]
+        taken = targets[winners]
+
+        losers = owner[taken]
+        won[losers[losers >= 0]] = -1
+        owner[taken] = free[winners]
+        won[free[winners]] = taken
+        prices[taken] = bids[winners]
+        free = numpy.flatnonzero(won < 0)
+    return won
+
+
+SOLVERS = {
+    'hungarian': hungarian,
+    'auction': auction,
+}
+
+
+def do_assignment(msg, fileTuple, solver='hungarian'):
+    """
+    Solves the same problem as Graph.do_flow with an assignment solver and prints its result
+    in the same form. Returns (flow, cost, rows, cols).
+    """
+    print("\n\n------- Assignment (" + solver + ") -------")
+    print(msg + " working with files ", fileTuple)
+    market = matches.loadMarket(fileTuple[0], fileTuple[1])
+    cost, sentinel = cost_matrix(market)
+    rows, cols = SOLVERS[solver](cost, sentinel)
+    total_cost = int(cost[rows, cols].sum())
+
+    print(f"Max flow: {len(rows)}, Min cost: {total_cost}")
+    print("Final Pairings are as follows:")
+    for p, a in zip(rows, cols):
+        print(f"Employer {market.proposerNames[p]} matched with Applicant {market.acceptorNames[a]}")
+    return len(rows), total_cost, rows, cols
+
+
+if __name__ == '__main__':
+    import contextlib
+    import io
+
+    from Graph import Graph, files
+
+    # Cross-check both solvers against the flow based matching
+    for fileTuple in files:
+        flow_report = io.StringIO()
+        with contextlib.redirect_stdout(flow_report):
+            Graph(fileTuple).do_flow("Proposing:", fileTuple)
+        flow_line = next(line for line in flow_report.getvalue().splitlines() if line.startswith("Max flow"))
+        for solver in SOLVERS:
+            flow, total_cost, rows, cols = do_assignment("Proposing:", fileTuple, solver)
+            assert flow_line == f"Max flow: {flow}, Min cost: {total_cost}", (solver, fileTuple, flow_line)
@@ -0,0 +1,417 @@
+"""
+Benchmark and differential test of the matching algorithms on generated markets.
+
+Example:
+    python benchmark.py --sizes 100 1000 --length 10 --correlation 0 2 --output results.json
+
+Each market is written out in the Employers*.txt / Applicants*.txt format, so the file based
+drivers (doStableMatch, doGreedyMatch, Graph.do_flow) run on it exactly as on the bundled
+files, and the array engines run on the loaded Market. The original loops on Proposer and
+Acceptor objects (Person.stable, Person.greedy) run on the files as the reference. Every
+engine is timed (best of --repeats), then run once more under tracemalloc for its peak
+memory. The engines of a group must agree: the stable ones on the matching itself, the
+greedy ones on the matching, and the flow ones on the number of pairs and the total rank.
+Each matching is also checked on its own against the Market: no stable one may have a
+blocking pair, and no greedy one may pass over an acceptor that was free and willing.
+The flow also has to pair at least as many people as any other matching, and
+IncrementalMatching has to keep its answers when every list is set again through its edit
+events. Lists may name people who are not in the market (--absent), which every engine must
+skip while still counting their place in the list. One JSON document holds every run, so
+results from different runs can be compared.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy
+
+import assignment
+import matches
+from Graph import Graph
+from incremental import IncrementalMatching
+
+
+def generate_market(proposers, acceptors, length, correlation=0.0, drop=0.0, seed=0, absent=0.0):
+    """
+    A random market on integer ids. Every proposer lists length acceptors, and every acceptor
+    ranks the proposers who listed it, leaving out a fraction drop of them as unacceptable.
+
+    Everyone has a hidden quality, and lists are drawn from a Plackett-Luce model where the
+    weight of a candidate is exp(correlation * quality): with correlation 0 lists are uniformly
+    random, and as it grows everybody agrees more on who is best.
+    With absent > 0, each entry is preceded with that probability by somebody who is not in
+    the market (an id past the other side's count).
+    Returns (proposer lists, acceptor lists).
+    """
+    rng = numpy.random.default_rng(seed)
+    length = min(length, acceptors)
+    weights = numpy.exp(correlation * rng.standard_normal(acceptors))
+    weights /= weights.sum()
+    uniform = correlation == 0
+    proposer_lists = [rng.choice(acceptors, size=length, replace=False, p=None if uniform else weights)
+                      for p in range(proposers)]
+
+    # Sorting by log weight plus Gumbel noise draws a Plackett-Luce ranking
+    owner = numpy.repeat(numpy.arange(proposers), length)
+    listed = numpy.concatenate(proposer_lists) if proposers else numpy.zeros(0, dtype=numpy.int64)
+    keep = rng.random(len(listed)) >= drop
+    owner, listed = owner[keep], listed[keep]
+    key = correlation * rng.standard_normal(proposers)[owner] + rng.gumbel(size=len(owner))
+    order = numpy.lexsort((-key, listed))
+    bounds = numpy.searchsorted(listed[order], numpy.arange(acceptors + 1))
+    acceptor_lists = [owner[order[bounds[a]:bounds[a + 1]]] for a in range(acceptors)]
+    if absent:
+        proposer_lists = add_absent(proposer_lists, acceptors, absent, rng)
+        acceptor_lists = add_absent(acceptor_lists, proposers, absent, rng)
+    return proposer_lists, acceptor_lists
+
+
+def add_absent(lists, others, absent, rng):
+    """Puts an id from others on, nobody in the market, before each entry with probability absent."""
+    result = []
+    for chosen in lists:
+        before = numpy.flatnonzero(rng.random(len(chosen)) < absent)
+        result.append(numpy.insert(chosen, before, others + numpy.arange(len(before))))
+    return result
+
+
+def write_market(proposer_lists, acceptor_lists, directory):
+    """
+    Writes the lists as Employers.txt and Applicants.txt in directory and returns their paths.
+    Proposer i is named 'p<i>' and acceptor j 'A<j>'; people with an empty list are left out.
+    """
+    paths = (os.path.join(directory, "Employers.txt"), os.path.join(directory, "Applicants.txt"))
+    for path, lists, own, other in ((paths[0], proposer_lists, 'p', 'A'), (paths[1], acceptor_lists, 'A', 'p')):
+        with open(path, 'w') as f:
+            for i, chosen in enumerate(lists):
+                if len(chosen):
+                    f.write(f"{own}{i}: " + ",".join(other + str(j) for j in chosen.tolist()) + "\n")
+    return paths
+
+
+def partner_positions(market, proposer):
+    """
+    For every entry of the proposers' lists, its proposer and its position in that list, plus
+    the position of each proposer's partner in its list (past every list when unmatched).
+    """
+    proposerCt = len(market.proposerNames)
+    owner = numpy.repeat(numpy.arange(proposerCt), numpy.diff(market.indptr))
+    position = numpy.arange(len(market.indices)) - market.indptr[owner]
+    matched = market.indices == proposer[owner]
+    partner_position = numpy.full(proposerCt, len(market.indices))
+    partner_position[owner[matched]] = position[matched]
+    return owner, position, partner_position, matched
+
+
+def blocking_pairs(market, proposer):
+    """Number of mutually acceptable pairs who would both rather have each other, for a one-to-one matching."""
+    proposerCt = len(market.proposerNames)
+    owner, position, partner_position, matched = partner_positions(market, proposer)
+    # the rank each acceptor gives its partner
+    holder_rank = numpy.full(len(market.acceptorNames), proposerCt)
+    holder_rank[market.indices[matched]] = market.entryRank[matched]
+    blocking = ((market.entryRank < proposerCt) & (position < partner_position[owner])
+                & (market.entryRank < holder_rank[market.indices]))
+    return int(blocking.sum())
+
+
+def greedy_misses(market, proposer):
+    """
+    Number of acceptors a greedy matching passed over: ones that list the proposer and come
+    before its partner in its list (or it has none), yet were still free or went to a later
+    proposer when its turn came.
+    """
+    proposerCt = len(market.proposerNames)
+    owner, position, partner_position, matched = partner_positions(market, proposer)
+    holder = numpy.full(len(market.acceptorNames), proposerCt)
+    holder[proposer[proposer >= 0]] = numpy.flatnonzero(proposer >= 0)
+    missed = ((market.entryRank < proposerCt) & (position < partner_position[owner])
+              & (holder[market.indices] > owner))
+    return int(missed.sum())
+
+
+def matching_result(matching):
+    matched = matching.proposer >= 0
+    return {'partner': matching.proposer,
+            'pairs': int(matched.sum()),
+            'total_rank': int(matching.proposerRank.sum() + matching.acceptorRank.sum())}
+
+
+def quiet(driver, *args):
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        return driver(*args)
+
+
+def person_result(proposers, acceptors, market):
+    """The result of a Person based loop, numbered as in the Market."""
+    ids = {name: a for a, name in enumerate(market.acceptorNames)}
+    partner = numpy.full(len(market.proposerNames), -1)
+    total_rank = 0
+    for p, name in enumerate(market.proposerNames):
+        person = proposers[name]
+        if person.partner:
+            partner[p] = ids[person.partner]
+            total_rank += person.rank + acceptors[person.partner].rank
+    return {'partner': partner, 'pairs': int((partner >= 0).sum()), 'total_rank': total_rank}
+
+
+def read_people(files):
+    proposers = {name: matches.Proposer(name, priorities) for name, priorities in matches.parseFile(files[0])}
+    acceptors = {name: matches.Acceptor(name, priorities) for name, priorities in matches.parseFile(files[1])}
+    return proposers, acceptors
+
+
+# Each engine takes (files, market) and returns a dict with pairs and total_rank, plus the
+# acceptor of each proposer ('partner') when the group compares matchings.
+
+def run_person_stable(files, market):
+    """
+    The loop on Proposer and Acceptor objects that doStableMatch ran before it moved to
+    galeShapley, kept as the reference for the stable engines. Names that are not in the
+    market are passed over.
+    """
+    proposers, acceptors = read_people(files)
+    unmatched = list(proposers)
+    while unmatched:
+        m = proposers[unmatched[0]]
+        n = m.nextProposal()
+        if n is None:
+            unmatched.pop(0)
+            continue
+        who = acceptors.get(n)
+        if who is None or not who.evaluateProposal(m.name):
+            continue
+        if who.partner:
+            # previous partner is getting dumped
+            oldMatch = proposers[who.partner]
+            oldMatch.partner = None
+            oldMatch.rank = 0
+            unmatched.append(oldMatch.name)
+        unmatched.pop(0)
+        who.partner = m.name
+        m.partner = who.name
+        m.rank = m.proposalIndex
+    return person_result(proposers, acceptors, market)
+
+
+def run_do_stable_match(files, market):
+    return matching_result(quiet(matches.doStableMatch, "Benchmark", files + (False,)))
+
+
+def run_gale_shapley(files, market):
+    return matching_result(matches.galeShapley(market.indptr, market.indices, market.entryRank,
+                                               len(market.acceptorNames), market.position, market.entryPosition))
+
+
+def run_deferred_acceptance(files, market):
+    pairs = matches.deferredAcceptance(market.indptr, market.indices, market.entryRank,
+                                       market.proposerQuota, market.acceptorQuota, market.position,
+                                       market.entryPosition)
+    partner = numpy.full(len(market.proposerNames), -1)
+    partner[pairs.proposer] = pairs.acceptor
+    return {'partner': partner, 'pairs': len(pairs.proposer),
+            'total_rank': int(pairs.proposerRank.sum() + pairs.acceptorRank.sum())}
+
+
+def run_person_greedy(files, market):
+    """The loop doGreedyMatch ran before it moved to greedyMatch, as the reference for it."""
+    proposers, acceptors = read_people(files)
+    paired = set()
+    unmatched = list(proposers)
+    while unmatched:
+        proposer = proposers[unmatched[0]]
+        acceptor = proposer.nextProposal()
+        while acceptor is not None and (acceptor in paired or acceptor not in acceptors):
+            acceptor = proposer.nextProposal()
+        if acceptor is None:
+            unmatched.pop(0)
+            continue
+        who = acceptors[acceptor]
+        if who.evaluateProposal(proposer.name):
+            unmatched.pop(0)
+            who.partner = proposer.name
+            proposer.partner = who.name
+            proposer.rank = proposer.proposalIndex
+            paired.add(acceptor)
+    return person_result(proposers, acceptors, market)
+
+
+def run_do_greedy_match(files, market):
+    return matching_result(quiet(matches.doGreedyMatch, "Benchmark", files + (False,)))
+
+
+def run_greedy_match(files, market):
+    return matching_result(matches.greedyMatch(market.indptr, market.indices, market.entryRank,
+                                               len(market.acceptorNames), market.position, market.entryPosition))
+
+
+def run_do_flow(files, market):
+    fileTuple = files + (False,)
+    flow, cost = quiet(lambda: Graph(fileTuple).do_flow("Benchmark", fileTuple))
+    return {'pairs': flow, 'total_rank': cost}
+
+
+def run_assignment(solver):
+    def run(files, market):
+        cost, sentinel = assignment.cost_matrix(market)
+        rows, cols = assignment.SOLVERS[solver](cost, sentinel)
+        return {'pairs': len(rows), 'total_rank': int(cost[rows, cols].sum())}
+    return run
+
+
+def run_incremental(files, market):
+    service = IncrementalMatching(market)
+    return {'pairs': len(service.optimal_pairs()), 'total_rank': service.optimal_cost()}
+
+
+# name -> (group, engine); engines of a group must agree
+ENGINES = {
+    'Person.stable': ('stable', run_person_stable),
+    'doStableMatch': ('stable', run_do_stable_match),
+    'galeShapley': ('stable', run_gale_shapley),
+    'deferredAcceptance': ('stable', run_deferred_acceptance),
+    'Person.greedy': ('greedy', run_person_greedy),
+    'doGreedyMatch': ('greedy', run_do_greedy_match),
+    'greedyMatch': ('greedy', run_greedy_match),
+    'Graph.do_flow': ('flow', run_do_flow),
+    'hungarian': ('flow', run_assignment('hungarian')),
+    'auction': ('flow', run_assignment('auction')),
+    'IncrementalMatching': ('flow', run_incremental),
+}
+
+
+def measure(engine, files, market, repeats, memory):
+    """Runs an engine, returning (result, best seconds, peak traced bytes or None)."""
+    best = float('inf')
+    for i in range(repeats):
+        start = time.perf_counter()
+        result = engine(files, market)
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        engine(files, market)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def replay_lists(files, market):
+    """
+    Whether IncrementalMatching keeps its answers when every list is given again with
+    set_acceptor and set_proposer, names as written in the files: edits and loadMarket must
+    rank the same lists alike.
+    """
+    service = IncrementalMatching(market)
+    stable, cost = sorted(service.stable_pairs()), service.optimal_cost()
+    for name, choices in matches.parseFile(files[1]):
+        service.set_acceptor(name, choices)
+    for name, choices in matches.parseFile(files[0]):
+        service.set_proposer(name, choices)
+    return sorted(service.stable_pairs()) == stable and service.optimal_cost() == cost
+
+
+def check(market, results):
+    """Cross checks the engines that ran. Returns {check name: passed}."""
+    checks = {}
+    by_group = {}
+    for name, result in results.items():
+        by_group.setdefault(ENGINES[name][0], []).append(result)
+    for group in ('stable', 'greedy'):
+        if group in by_group:
+            first = by_group[group][0]['partner']
+            checks[group + '_agree'] = all(numpy.array_equal(first, r['partner']) for r in by_group[group])
+    if 'stable' in by_group:
+        checks['stable_has_no_blocking_pair'] = all(blocking_pairs(market, r['partner']) == 0
+                                                    for r in by_group['stable'])
+    if 'greedy' in by_group:
+        checks['greedy_misses_nobody'] = all(greedy_misses(market, r['partner']) == 0 for r in by_group['greedy'])
+    if 'flow' in by_group:
+        first = by_group['flow'][0]
+        checks['flow_agree'] = all((r['pairs'], r['total_rank']) == (first['pairs'], first['total_rank'])
+                                   for r in by_group['flow'])
+        checks['flow_pairs_most'] = all(first['pairs'] >= r['pairs'] for r in results.values())
+    return checks
+
+
+def run(sizes, lengths, correlations, drop=0.0, engines=None, repeats=1, memory=True, seed=0, log=sys.stderr,
+        absent=0.0):
+    """Benchmarks every engine on one market per (size, length, correlation). Returns the list of runs."""
+    engines = engines or list(ENGINES)
+    runs = []
+    for size in sizes:
+        for length in lengths:
+            for correlation in correlations:
+                proposer_lists, acceptor_lists = generate_market(size, size, length, correlation, drop, seed, absent)
+                with tempfile.TemporaryDirectory() as directory:
+                    files = write_market(proposer_lists, acceptor_lists, directory)
+                    # loading first parses the text; every engine after it reads the cached arrays
+                    start = time.perf_counter()
+                    market = matches.loadMarket(*files)
+                    record = {'size': size, 'length': length, 'correlation': correlation, 'drop': drop,
+                              'absent': absent, 'seed': seed, 'entries': len(market.indices),
+                              'engines': {'loadMarket': {'seconds': time.perf_counter() - start}}}
+                    results = {}
+                    for name in engines:
+                        result, seconds, peak = measure(ENGINES[name][1], files, market, repeats, memory)
+                        results[name] = result
+                        record['engines'][name] = {'seconds': seconds, 'peak_bytes': peak,
+                                                   'pairs': result['pairs'], 'total_rank': result['total_rank']}
+                        if ENGINES[name][0] == 'stable':
+                            record['engines'][name]['blocking_pairs'] = blocking_pairs(market, result['partner'])
+                        elif ENGINES[name][0] == 'greedy':
+                            record['engines'][name]['greedy_misses'] = greedy_misses(market, result['partner'])
+                        print(f"size {size} length {length} correlation {correlation}: "
+                              f"{name} {seconds:.3f}s", file=log)
+                    record['checks'] = check(market, results)
+                    if 'IncrementalMatching' in results:
+                        record['checks']['incremental_edits_agree'] = replay_lists(files, market)
+                runs.append(record)
+    return runs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and cross check the matching algorithms on generated markets.")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000],
+                        help="people on each side of a market")
+    parser.add_argument('--length', nargs='+', type=int, default=[10], help="length of every proposer's list")
+    parser.add_argument('--correlation', nargs='+', type=float, default=[0.0],
+                        help="how much people agree on who is best (0: independent lists)")
+    parser.add_argument('--drop', type=float, default=0.0,
+                        help="fraction of the proposers who list an acceptor that it finds unacceptable")
+    parser.add_argument('--absent', type=float, default=0.05,
+                        help="chance that a list entry is preceded by somebody who is not in the market")
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES),
+                        help="engines to run (default: all)")
+    parser.add_argument('--repeats', type=int, default=1, help="timed runs per engine; the best is kept")
+    parser.add_argument('--no-memory', action='store_true', help="skip the traced run for peak memory")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', '-o', help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    runs = run(args.sizes, args.length, args.correlation, args.drop, args.engines, args.repeats,
+               not args.no_memory, args.seed, absent=args.absent)
+    document = {'python': platform.python_version(), 'numpy': numpy.__version__,
+                'machine': platform.machine(), 'runs': runs}
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        json.dump(document, out, indent=2)
+        out.write("\n")
+    finally:
+        if args.output:
+            out.close()
+    failed = [(r['size'], r['length'], r['correlation'], name)
+              for r in runs for name, passed in r['checks'].items() if not passed]
+    for failure in failed:
+        print("Check failed: size {} length {} correlation {}: {}".format(*failure), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
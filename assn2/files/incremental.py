@@ -0,0 +1,522 @@
+"""
+A matching kept up to date while participants come and go and edit their lists.
+
+doStableMatch and Graph.do_flow both start from nothing. Here the preference lists, the
+inverse rank tables and both answers stay in memory, and every change only redoes the work it
+invalidates:
+
+  stable: the proposer optimal stable matching. Deferred acceptance does not care in which
+    order proposals are made, so any run that could have happened under the new lists can
+    simply be continued. Every rejection remembers who it was made in favor of; a change
+    undoes the rejections that no longer hold, then everything resting on those, and only
+    the proposers affected propose again. In a random market that cascade easily reaches
+    everyone, and redoing it proposal by proposal is slower than matches.galeShapley on
+    arrays, so past REWIND_LIMIT of the proposers the change starts over from galeShapley.
+  optimal: the centralized matching of Graph.do_flow (as many pairs as possible, then the
+    least summed rank). It is kept as a square assignment with object prices, which are the
+    vertex potentials of the residual graph. A change frees the rows whose arcs it touched,
+    fixes the prices locally so no arc has a negative reduced cost, and re-routes only the
+    freed rows with one shortest path search each.
+
+Only one-to-one markets are handled; doCapacitatedMatch covers quotas from scratch.
+"""
+import heapq
+from collections import deque
+from itertools import chain
+
+import numpy
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+import matches
+
+REWIND_LIMIT = 0.01  # fraction of the proposers a change may send back before it starts over
+
+
+def _span(ranks):
+    """Length of a list up to its last ranked entry."""
+    return max(ranks, default=-1) + 1
+
+
+class IncrementalMatching:
+    """
+    Proposers and acceptors are kept by name, as in the preference files. A name that shows up
+    in a list before it has a list of its own is registered as absent: it proposes nothing and
+    accepts nobody until set_proposer or set_acceptor gives it a list. Ranks are positions in
+    the lists as given, absent names included, which is how loadMarket counts them too.
+
+    loadMarket drops the names that have no list of their own, keeping only the positions of
+    the entries after them. Given proposerLists and acceptorLists, the (name, list) pairs of
+    matches.parseFile, the lists naming such people are read from those instead, so the
+    entries are there once the person gets a list.
+    """
+
+    def __init__(self, market, proposerLists=(), acceptorLists=()):
+        if (market.proposerQuota > 1).any() or (market.acceptorQuota > 1).any():
+            raise ValueError("IncrementalMatching only handles one-to-one markets")
+        self.proposerNames, self.acceptorNames = [], []
+        self.proposerId, self.acceptorId = {}, {}
+        self.choices = []  # acceptors listed by each proposer, best first
+        self.position = []  # acceptor -> index in choices, for each proposer
+        self.proposerRank = []  # acceptor -> rank, for each proposer
+        self.acceptorRank = []  # proposer -> rank, for each acceptor (the inverse rank table)
+        self.proposerActive, self.acceptorActive = [], []
+
+        # deferred acceptance state
+        self.partner = []  # acceptor holding each proposer, or -1
+        self.holder = []  # proposer held by each acceptor, or -1
+        self.pointer = []  # index in choices of the next acceptor each proposer would try
+        self.reason = []  # reason[p][j]: who p was rejected for at choices[p][j], -1 if unacceptable
+        self.listedBy = []  # proposers listing each acceptor
+        self.rankMatrix = None  # see _rank_matrix
+
+        # assignment state, see _flow_arcs
+        self.arcs = []  # object -> cost, for each row
+        self.assigned = []  # object of each row, or -1
+        self.owner = []  # row of each object, or -1
+        self.price = []
+        self.listTotal = 0  # summed length of the active lists, up to their last ranked entry
+        self.unmatchedCost = 1
+
+        for name in market.acceptorNames:
+            self._acceptor(name)
+        for name in market.proposerNames:
+            self._proposer(name)
+        for a in range(len(market.acceptorNames)):
+            start, end = market.acceptorIndptr[a], market.acceptorIndptr[a + 1]
+            self._set_acceptor_list(a, market.acceptorIndices[start:end].tolist(),
+                                    market.acceptorPosition[start:end].tolist())
+        for p in range(len(market.proposerNames)):
+            start, end = market.indptr[p], market.indptr[p + 1]
+            self._set_proposer_list(p, market.indices[start:end].tolist(), market.position[start:end].tolist())
+        listed = len(self.proposerNames), len(self.acceptorNames)
+        for name, choices in acceptorLists:
+            if any(q and self.proposerId.get(q, listed[0]) >= listed[0] for q in choices):
+                self._set_acceptor_list(self.acceptorId[name], *self._written(choices, self._proposer))
+        for name, choices in proposerLists:
+            if any(a and self.acceptorId.get(a, listed[1]) >= listed[1] for a in choices):
+                self._set_proposer_list(self.proposerId[name], *self._written(choices, self._acceptor))
+        self._restart()
+        self._solve()
+
+    @classmethod
+    def from_files(cls, proposerFile, acceptorFile):
+        return cls(matches.loadMarket(proposerFile, acceptorFile), matches.parseFile(proposerFile),
+                   matches.parseFile(acceptorFile))
+
+    # ---- events ----
+
+    def set_proposer(self, name, choices):
+        """Adds the proposer, or replaces its list. choices are acceptor names, best first."""
+        p = self._proposer(name)
+        ids = [self._acceptor(a) for a in choices]
+        old = self.choices[p] if self.proposerActive[p] else []
+        keep = 0
+        while keep < min(len(old), len(ids)) and old[keep] == ids[keep]:
+            keep += 1
+        # rejections on the unchanged front of the list still hold
+        moved = self._rewind([(p, keep)])
+        self._set_proposer_list(p, ids)
+        self._resume(None if moved is None else moved + [p])
+        self._repair_flow(self._proposer_rows(p, old + ids))
+
+    def set_acceptor(self, name, choices):
+        """Adds the acceptor, or replaces its list. choices are proposer names, best first."""
+        a = self._acceptor(name)
+        ids = [self._proposer(p) for p in choices]
+        old = list(self.acceptorRank[a]) if self.acceptorActive[a] else []
+        self._set_acceptor_list(a, ids)
+        # every rejection this acceptor made, and its current hold, is decided again
+        rewind = [(q, self.position[q][a]) for q in self.listedBy[a] if self.position[q][a] < self.pointer[q]]
+        self._resume(self._rewind(rewind))
+        self._repair_flow(self._acceptor_rows(a, old + ids))
+
+    def remove_proposer(self, name):
+        p = self.proposerId[name]
+        old = self.choices[p]
+        moved = self._rewind([(p, 0)])
+        self._set_proposer_list(p, [], active=False)
+        self._resume(moved)
+        self._repair_flow(self._proposer_rows(p, old))
+
+    def remove_acceptor(self, name):
+        a = self.acceptorId[name]
+        old = list(self.acceptorRank[a])
+        h = self.holder[a]
+        self._set_acceptor_list(a, [], active=False)
+        if h >= 0:
+            # the rejections made in favor of h here still hold: a is simply skipped now
+            self.holder[a] = self.partner[h] = -1
+            self.reason[h][self.pointer[h] - 1] = -1
+            self._propose([h])
+        self._repair_flow(self._acceptor_rows(a, old))
+
+    # ---- results ----
+
+    def stable_pairs(self):
+        """(proposer, acceptor) names of the proposer optimal stable matching."""
+        return [(self.proposerNames[p], self.acceptorNames[a]) for p, a in enumerate(self.partner) if a >= 0]
+
+    def optimal_pairs(self):
+        """(proposer, acceptor) names of the centralized matching Graph.do_flow would find."""
+        return [(self.proposerNames[p], self.acceptorNames[self.assigned[2 * p] // 2])
+                for p in range(len(self.proposerNames)) if self.assigned[2 * p] % 2 == 0]
+
+    def optimal_cost(self):
+        return sum(self.arcs[2 * p][self.assigned[2 * p]] for p in range(len(self.proposerNames))
+                   if self.assigned[2 * p] % 2 == 0)
+
+    # ---- preferences ----
+
+    def _proposer(self, name):
+        if name not in self.proposerId:
+            p = self.proposerId[name] = len(self.proposerNames)
+            self.proposerNames.append(name)
+            self.choices.append([])
+            self.position.append({})
+            self.proposerRank.append({})
+            self.proposerActive.append(False)
+            self.rankMatrix = None
+            self.partner.append(-1)
+            self.pointer.append(0)
+            self.reason.append([])
+            self._add_flow_node()
+        return self.proposerId[name]
+
+    def _acceptor(self, name):
+        if name not in self.acceptorId:
+            self.acceptorId[name] = len(self.acceptorNames)
+            self.acceptorNames.append(name)
+            self.acceptorRank.append({})
+            self.acceptorActive.append(False)
+            self.rankMatrix = None
+            self.holder.append(-1)
+            self.listedBy.append(set())
+            self._add_flow_node()
+        return self.acceptorId[name]
+
+    @staticmethod
+    def _written(choices, register):
+        """ids and positions of the named entries of a list as written, registering new names"""
+        entries = [(register(name), i) for i, name in enumerate(choices) if name]
+        return [i for i, _ in entries], [rank for _, rank in entries]
+
+    def _set_proposer_list(self, p, ids, ranks=None, active=True):
+        """ranks: the position of each id in the list as written, by default its index in ids"""
+        ranks = range(len(ids)) if ranks is None else ranks
+        self.listTotal += _span(ranks) - _span(self.proposerRank[p].values())
+        for a in self.choices[p]:
+            self.listedBy[a].discard(p)
+        for a in ids:
+            self.listedBy[a].add(p)
+        self.choices[p] = ids
+        self.position[p] = {a: i for i, a in enumerate(ids)}
+        self.proposerRank[p] = dict(zip(ids, ranks))
+        self.reason[p] = self.reason[p][:self.pointer[p]] + [-1] * (len(ids) - self.pointer[p])
+        self.proposerActive[p] = active
+
+    def _set_acceptor_list(self, a, ids, ranks=None, active=True):
+        ranks = range(len(ids)) if ranks is None else ranks
+        self.listTotal += _span(ranks) - _span(self.acceptorRank[a].values())
+        self.acceptorRank[a] = dict(zip(ids, ranks))
+        self.rankMatrix = None
+        self.acceptorActive[a] = active
+
+    # ---- deferred acceptance ----
+
+    def _rewind(self, pending):
+        """
+        Sends each (proposer, index) back to propose from that index of its list, along with
+        every rejection made in favor of it past that point, and so on. Returns the proposers
+        moved, or None once they pass REWIND_LIMIT: the state is then left half undone, for
+        _resume to rebuild.
+        """
+        limit = REWIND_LIMIT * len(self.proposerNames)
+        moved = []
+        while pending:
+            p, k = pending.pop()
+            if self.pointer[p] <= k:
+                continue
+            moved.append(p)
+            if len(moved) > limit:
+                return None
+            a = self.partner[p]
+            if a >= 0:
+                self.holder[a] = self.partner[p] = -1
+            # the rejections made in favor of p past k were made by the acceptors it held there
+            for a in self.choices[p][k:self.pointer[p]]:
+                for q in self.listedBy[a]:
+                    j = self.position[q][a]
+                    if j < self.pointer[q] and self.reason[q][j] == p:
+                        pending.append((q, j))
+            self.pointer[p] = k
+        return moved
+
+    def _resume(self, moved):
+        """Lets the proposers _rewind moved propose again, or starts over when it gave up."""
+        if moved is None:
+            self._restart()
+        else:
+            self._propose(moved)
+
+    def _restart(self):
+        """
+        Runs matches.galeShapley on the current lists and rebuilds the deferred acceptance
+        state from its matching. Each proposer was rejected by everyone before its partner,
+        and each of those rejections is put down to the acceptor's final partner, who by
+        stability it prefers; that is a run _propose could have made.
+        """
+        proposerCt, acceptorCt = len(self.proposerNames), len(self.acceptorNames)
+        lengths = numpy.array([len(ids) for ids in self.choices], dtype=numpy.int64)
+        indptr = numpy.zeros(proposerCt + 1, dtype=numpy.int64)
+        numpy.cumsum(lengths, out=indptr[1:])
+        indices = numpy.fromiter(chain.from_iterable(self.choices), dtype=numpy.int64, count=indptr[-1])
+        owner = numpy.repeat(numpy.arange(proposerCt), lengths)
+        index = numpy.arange(len(indices)) - indptr[owner]
+        entryRank = numpy.full(len(indices), proposerCt, dtype=numpy.int64)
+        if len(indices):
+            entryRank += numpy.asarray(self._rank_matrix()[indices, owner]).ravel()
+        matching = matches.galeShapley(indptr, indices, entryRank, acceptorCt)
+
+        # A proposer stops at the first entry naming its partner
+        pointer = lengths.copy()
+        matched = numpy.flatnonzero(indices == matching.proposer[owner])[::-1]
+        pointer[owner[matched]] = index[matched] + 1
+        rejected = index < pointer[owner] - (matching.proposer >= 0)[owner]
+        reason = numpy.where(rejected & (entryRank < proposerCt), matching.acceptor[indices], -1)
+
+        self.partner = matching.proposer.tolist()
+        self.holder = matching.acceptor.tolist()
+        self.pointer = pointer.tolist()
+        reasons, bounds = reason.tolist(), indptr.tolist()
+        self.reason = [reasons[start:end] for start, end in zip(bounds, bounds[1:])]
+
+    def _rank_matrix(self):
+        """
+        The acceptors' rank tables as a sparse matrix, kept until an acceptor list changes or
+        someone new shows up. Ranks are stored less the number of proposers, so none is an
+        explicit zero and a missing entry, added back the same, reads as unlisted.
+        """
+        if self.rankMatrix is None:
+            proposerCt, acceptorCt = len(self.proposerNames), len(self.acceptorNames)
+            lengths = numpy.array([len(ranks) for ranks in self.acceptorRank], dtype=numpy.int64)
+            indptr = numpy.zeros(acceptorCt + 1, dtype=numpy.int64)
+            numpy.cumsum(lengths, out=indptr[1:])
+            # Removed and absent acceptors have empty tables, so they accept nobody here either
+            indices = numpy.fromiter(chain.from_iterable(self.acceptorRank), dtype=numpy.int64, count=indptr[-1])
+            ranks = numpy.arange(len(indices)) - numpy.repeat(indptr[:-1], lengths) - proposerCt
+            self.rankMatrix = csr_matrix((ranks, indices, indptr), shape=(acceptorCt, proposerCt))
+        return self.rankMatrix
+
+    def _propose(self, proposers):
+        """Deferred acceptance from the current state until no free proposer has anyone left to try."""
+        free = [p for p in proposers if self.partner[p] < 0]
+        while free:
+            p = free.pop()
+            if not self.proposerActive[p] or self.partner[p] >= 0:
+                continue
+            choices, reason = self.choices[p], self.reason[p]
+            while self.pointer[p] < len(choices):
+                j = self.pointer[p]
+                a = choices[j]
+                self.pointer[p] += 1
+                rank = self.acceptorRank[a].get(p) if self.acceptorActive[a] else None
+                if rank is None:
+                    reason[j] = -1
+                    continue
+                h = self.holder[a]
+                if h >= 0 and self.acceptorRank[a][h] < rank:
+                    reason[j] = h
+                    continue
+                if h >= 0:
+                    # h is let go in favor of p and tries further down its list
+                    self.reason[h][self.pointer[h] - 1] = p
+                    self.partner[h] = -1
+                    free.append(h)
+                self.holder[a] = p
+                self.partner[p] = a
+                break
+
+    # ---- centralized matching ----
+    # Rows are the proposers (2p) and a stand-in for each acceptor (2a + 1); objects are the
+    # acceptors (2a) and an "unmatched" object private to each proposer (2p + 1). A proposer
+    # may take any acceptor it shares a pair with, at the summed 1 based ranks, or its own
+    # unmatched object at unmatchedCost. The stand-in of an acceptor takes the acceptor when
+    # it is left over, or else the unmatched object of some proposer it shares a pair with,
+    # both at no cost. So the assignment is square and always perfect, and with unmatchedCost
+    # above any total of real costs it first maximizes the pairs, like the flow.
+
+    def _add_flow_node(self):
+        # rows and objects come in pairs, so the numbering never changes as either side grows.
+        # A new pair starts as an absent proposer on its unmatched object and an absent
+        # acceptor's stand-in on the acceptor.
+        while len(self.arcs) < 2 * max(len(self.proposerNames), len(self.acceptorNames)):
+            k = len(self.arcs)
+            self.arcs += [{k + 1: 0}, {k: 0}]
+            self.assigned += [k + 1, k]
+            self.owner += [k + 1, k]
+            self.price += [0, 0]
+
+    def _pair_cost(self, p, a):
+        """Summed 1 based ranks of a pair, or None when it is not allowed."""
+        if not (self.proposerActive[p] and self.acceptorActive[a]):
+            return None
+        i, r = self.proposerRank[p].get(a), self.acceptorRank[a].get(p)
+        return None if i is None or r is None else i + r + 2
+
+    def _flow_arcs(self, row):
+        if row % 2 == 0:
+            p = row // 2
+            if p >= len(self.proposerNames) or not self.proposerActive[p]:
+                return {row + 1: 0}
+            arcs = {row + 1: self.unmatchedCost}
+            for a in self.choices[p]:
+                cost = self._pair_cost(p, a)
+                if cost is not None:
+                    arcs[2 * a] = cost
+        else:
+            a = row // 2
+            if a >= len(self.acceptorNames):
+                return {row - 1: 0}
+            arcs = {2 * p + 1: 0 for p in self.acceptorRank[a] if self._pair_cost(p, a) is not None}
+            arcs[2 * a] = 0
+        return arcs
+
+    def _proposer_rows(self, p, acceptors):
+        return [2 * p] + [2 * a + 1 for a in set(acceptors)]
+
+    def _acceptor_rows(self, a, proposers):
+        return [2 * a + 1] + [2 * p for p in set(proposers)]
+
+    def _free(self, row):
+        if self.assigned[row] >= 0:
+            self.owner[self.assigned[row]] = -1
+            self.assigned[row] = -1
+
+    def _solve(self):
+        """
+        Solves from scratch, for a start or when unmatchedCost has to grow, with scipy's sparse
+        assignment solver. It drops explicit zeros, so every cost is shifted up by one; each row
+        takes exactly one arc, so that does not change the optimum.
+        """
+        self.unmatchedCost = 2 * self.listTotal + 1
+        rows = len(self.arcs)
+        self.arcs = [self._flow_arcs(row) for row in range(rows)]
+        indptr = numpy.cumsum([0] + [len(arcs) for arcs in self.arcs])
+        indices = numpy.fromiter((obj for arcs in self.arcs for obj in arcs), dtype=numpy.int64, count=indptr[-1])
+        data = numpy.fromiter((cost + 1 for arcs in self.arcs for cost in arcs.values()), dtype=float, count=indptr[-1])
+        matched, objects = min_weight_full_bipartite_matching(csr_matrix((data, indices, indptr), shape=(rows, rows)))
+        self.assigned = [-1] * rows
+        self.owner = [-1] * rows
+        for row, obj in zip(matched.tolist(), objects.tolist()):
+            self.assigned[row] = obj
+            self.owner[obj] = row
+        self.price = self._potentials()
+
+    def _potentials(self):
+        """
+        Prices that make every arc's reduced cost non negative and every assigned arc's zero.
+        Moving a row from its object x to another object o changes the cost by
+        arcs[row][o] - arcs[row][x], so that is an edge x -> o of the residual graph, and the
+        shortest distances over those edges (Bellman-Ford with a queue, as in Graph) are such
+        prices. An optimal assignment leaves no negative cycle.
+        """
+        distance = [0] * len(self.arcs)
+        queued = [True] * len(self.arcs)
+        queue = deque(range(len(self.arcs)))
+        while queue:
+            x = queue.popleft()
+            queued[x] = False
+            row = self.owner[x]
+            base = distance[x] - self.arcs[row][x]
+            for obj, cost in self.arcs[row].items():
+                if base + cost < distance[obj]:
+                    distance[obj] = base + cost
+                    if not queued[obj]:
+                        queued[obj] = True
+                        queue.append(obj)
+        return distance
+
+    def _repair_flow(self, rows):
+        """Refreshes the arcs of the rows an event touched and re-routes what it broke."""
+        if self.listTotal >= self.unmatchedCost:
+            self._solve()
+            return
+        freed = []
+        for row in rows:
+            old, new = self.arcs[row], self._flow_arcs(row)
+            self.arcs[row] = new
+            mine = self.assigned[row]
+            if mine >= 0 and old.get(mine) != new.get(mine):
+                self._free(row)
+                freed.append(row)
+            if self.assigned[row] < 0:
+                continue
+            # a new or cheaper arc must not have a negative reduced cost; lowering the price
+            # of its object keeps it that way but frees the row holding the object
+            base = new[mine] - self.price[mine]
+            for obj, cost in new.items():
+                if cost < old.get(obj, cost + 1) and cost - base - self.price[obj] < 0:
+                    self.price[obj] = cost - base
+                    if self.owner[obj] >= 0 and self.owner[obj] != row:
+                        freed.append(self.owner[obj])
+                        self._free(self.owner[obj])
+        for row in freed:
+            if self.assigned[row] < 0:
+                self._augment(row)
+
+    def _augment(self, row):
+        """
+        Jonker-Volgenant step: Dijkstra from a free row over reduced costs, alternating between
+        objects and the rows holding them, until it reaches a free object. Prices of the objects
+        settled before it are lowered so the path is tight, then the path is flipped.
+        """
+        arcs, owner, price = self.arcs, self.owner, self.price
+        base = min(cost - price[obj] for obj, cost in arcs[row].items())
+        heap = [(cost - price[obj] - base, obj, row) for obj, cost in arcs[row].items()]
+        heapq.heapify(heap)
+        settled, via = {}, {}
+        while True:
+            d, obj, r = heapq.heappop(heap)
+            if obj in settled:
+                continue
+            settled[obj], via[obj] = d, r
+            holder = owner[obj]
+            if holder < 0:
+                break
+            base = arcs[holder][obj] - price[obj]
+            for nxt, cost in arcs[holder].items():
+                if nxt not in settled:
+                    heapq.heappush(heap, (d + cost - price[nxt] - base, nxt, holder))
+        for o, settled_d in settled.items():
+            price[o] += settled_d - d
+        while True:
+            r = via[obj]
+            previous = self.assigned[r]
+            self.assigned[r] = obj
+            owner[obj] = r
+            if r == row:
+                break
+            obj = previous
+
+
+if __name__ == '__main__':
+    service = IncrementalMatching.from_files("Employers1.txt", "Applicants1.txt")
+
+    def show(event):
+        print("\n" + event)
+        print("Stable:", ", ".join(f"{p}-{a}" for p, a in service.stable_pairs()))
+        print(f"Optimal (cost {service.optimal_cost()}):", ", ".join(f"{p}-{a}" for p, a in service.optimal_pairs()))
+
+    show("Employers1.txt / Applicants1.txt")
+    withdrawn = service.acceptorNames[0]
+    service.remove_acceptor(withdrawn)
+    show(f"Applicant {withdrawn} withdraws")
+    first = service.proposerNames[0]
+    service.set_proposer(first, [service.acceptorNames[a] for a in reversed(service.choices[service.proposerId[first]])])
+    show(f"Employer {first} reverses its list")
+    service.set_acceptor("Z", service.proposerNames)
+    for name in service.proposerNames:
+        p = service.proposerId[name]
+        service.set_proposer(name, ["Z"] + [service.acceptorNames[a] for a in service.choices[p]])
+    show("Applicant Z joins, and every employer puts Z first")
@@ -13,7 +13,19 @@ and likewise for the applicant file,  and the identifiers should be
 self-consistent between the two files.
 If a match is unacceptable, it is not listed in the preferences.
 
+A name may be followed by a quota in parentheses, the number of partners that
+person takes (1 if left out), e.g. an employer hiring two applicants:
+
+  bob (2): alice,carol,erin
+
+Only doCapacitatedMatch and the flow based matching in Graph use quotas.
+
 """
+import heapq
+import os
+from collections import deque, namedtuple
+
+import numpy
 from numpy import *
 
 class Person:
@@ -96,16 +108,28 @@ class Acceptor(Person):
         else:
             return False
 
+def splitQuota(name):
+    """
+    Split 'bob (2)' into ('bob', 2); a name without a quota has quota 1. Only a number in
+    the brackets is a quota, so 'Smith (Jr)' stays a whole name.
+    """
+    if name.endswith(')') and '(' in name:
+        rest, quota = name[:-1].rsplit('(', 1)
+        if quota.strip().isdigit():
+            return rest.strip(), int(quota)
+    return name, 1
+
+
 def parseFile(filename):
     """
-    Returns a list of (name,priority_list) pairs.
+    Returns a list of (name,priority_list) pairs. Quotas are ignored.
     """
     people = []
     # f = file(filename)
     with open(filename) as f:
         for line in f:
             pieces = line.split(':')
-            name = pieces[0].strip()
+            name = splitQuota(pieces[0].strip())[0]
             if name:
                 priorities = pieces[1].strip().split(',')
                 for i in range(len(priorities)):
@@ -134,60 +158,422 @@ def printPairings(proposer, acceptor):
           'for', matchCt, 'matchings')
 
 
+# Preferences of both sides of a market, with everybody numbered in file order.
+#   proposerNames, acceptorNames: id -> name
+#   indptr, indices: proposer p's choices, best first, are indices[indptr[p]:indptr[p+1]]
+#   entryRank: for every entry of indices, the 0 based rank the acceptor gives that proposer,
+#     or len(proposerNames) when the acceptor does not list the proposer at all
+#   acceptorIndptr, acceptorIndices: the acceptors' lists, stored the same way
+#   proposerQuota, acceptorQuota: how many partners each person takes
+#   position, acceptorPosition: for every entry of indices (acceptorIndices), its 0 based position
+#     in the list as written, counting names that are not in the market; ranks and costs use these
+#   entryPosition: for every entry of indices, the position of the proposer in the acceptor's list
+#     as written (meaningful where entryRank < len(proposerNames))
+Market = namedtuple('Market', ['proposerNames', 'acceptorNames', 'indptr', 'indices', 'entryRank',
+                               'acceptorIndptr', 'acceptorIndices', 'proposerQuota', 'acceptorQuota',
+                               'position', 'entryPosition', 'acceptorPosition'])
+
+
+def readPreferences(filename):
+    """
+    Reads one preference file into arrays. Every distinct name in the priority lists is
+    stored once, in vocabulary, and the lists themselves become integer codes:
+    line i lists vocabulary[codes[indptr[i]:indptr[i+1]]], and names[i] takes quotas[i] partners.
+
+    The arrays are cached in filename + '.npz' and reused as long as the text file keeps
+    its size and modification time.
+    Returns (names, quotas, indptr, vocabulary, codes).
+    """
+    stat = os.stat(filename)
+    stamp = numpy.array([stat.st_size, stat.st_mtime_ns], dtype=numpy.int64)
+    cachePath = filename + '.npz'
+    try:
+        with numpy.load(cachePath) as cache:
+            if numpy.array_equal(cache['stamp'], stamp):
+                return (cache['names'].tolist(), cache['quotas'], cache['indptr'], cache['vocabulary'].tolist(),
+                        cache['codes'])
+    except (OSError, KeyError, ValueError):
+        pass  # no usable cache; parse the text
+
+    names = []
+    quotas = []
+    lengths = []
+    codes = []
+    vocabulary = {}
+    with open(filename) as f:
+        for line in f:
+            pieces = line.split(':')
+            name, quota = splitQuota(pieces[0].strip())
+            if name:
+                priorities = [vocabulary.setdefault(p.strip(), len(vocabulary)) for p in pieces[1].split(',')]
+                names.append(name)
+                quotas.append(quota)
+                lengths.append(len(priorities))
+                codes.extend(priorities)
+    indptr = numpy.zeros(len(names) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=indptr[1:])
+    codes = numpy.array(codes, dtype=numpy.int64)
+    quotas = numpy.array(quotas, dtype=numpy.int64)
+    vocabulary = list(vocabulary)
+
+    try:
+        tempPath = filename + '.tmp.npz'
+        numpy.savez(tempPath, stamp=stamp, names=numpy.array(names, dtype=str), quotas=quotas, indptr=indptr,
+                    vocabulary=numpy.array(vocabulary, dtype=str), codes=codes)
+        os.replace(tempPath, cachePath)  # never leave a half written cache behind
+    except OSError:
+        pass  # a read only directory just means no cache
+    return names, quotas, indptr, vocabulary, codes
+
+
+def internLists(indptr, vocabulary, codes, names):
+    """
+    Turn the codes of readPreferences into ids of the other side, numbered by their
+    position in names. Entries naming nobody on the other side are dropped, since they
+    can never be matched, but the entries after them keep their position in the list as
+    written. Returns (indptr, indices, position).
+    """
+    ids = {name: i for i, name in enumerate(names)}
+    table = numpy.array([ids.get(name, -1) for name in vocabulary], dtype=numpy.int64)
+    indices = table[codes]
+    keep = indices >= 0
+    owner = numpy.repeat(numpy.arange(len(indptr) - 1), numpy.diff(indptr))
+    position = numpy.arange(len(codes)) - indptr[owner]
+    kept = numpy.zeros(len(indptr), dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(owner[keep], minlength=len(indptr) - 1), out=kept[1:])
+    return kept, indices[keep], position[keep]
+
+
+def inverseRanks(indptr, indices, acceptorIndptr, acceptorIndices, acceptorPosition=None):
+    """
+    The entryRank of a Market: for every entry of the proposers' lists, the 0 based rank
+    the acceptor gives that proposer, or the number of proposers if it does not list them.
+    Given the acceptorPosition of the entries, their positions are returned instead of ranks
+    (the entryPosition of a Market).
+    """
+    proposerCt = len(indptr) - 1
+    # Look up each (acceptor, proposer) entry of the proposers' lists among the acceptors' lists
+    acceptorOwner = numpy.repeat(numpy.arange(len(acceptorIndptr) - 1), numpy.diff(acceptorIndptr))
+    keys = acceptorOwner * proposerCt + acceptorIndices
+    order = numpy.argsort(keys, kind='stable')
+    keys = keys[order]
+    if acceptorPosition is None:
+        acceptorPosition = numpy.arange(len(acceptorIndices)) - acceptorIndptr[acceptorOwner]
+    ranks = acceptorPosition[order]
+
+    proposerOwner = numpy.repeat(numpy.arange(proposerCt), numpy.diff(indptr))
+    wanted = indices * proposerCt + proposerOwner
+    entryRank = numpy.full(len(indices), proposerCt, dtype=numpy.int64)
+    if len(keys):
+        at = numpy.minimum(numpy.searchsorted(keys, wanted), len(keys) - 1)
+        found = keys[at] == wanted
+        entryRank[found] = ranks[at[found]]
+    return entryRank
+
+
+def loadMarket(proposerFile, acceptorFile):
+    """
+    Loads both preference files of a market into a Market, the input of galeShapley,
+    greedyMatch and the flow based matching in Graph.
+    """
+    proposerNames, proposerQuota, indptr, vocabulary, codes = readPreferences(proposerFile)
+    acceptorNames, acceptorQuota, acceptorIndptr, acceptorVocabulary, acceptorCodes = readPreferences(acceptorFile)
+    indptr, indices, position = internLists(indptr, vocabulary, codes, acceptorNames)
+    acceptorIndptr, acceptorIndices, acceptorPosition = internLists(acceptorIndptr, acceptorVocabulary,
+                                                                    acceptorCodes, proposerNames)
+    entryRank = inverseRanks(indptr, indices, acceptorIndptr, acceptorIndices)
+    entryPosition = inverseRanks(indptr, indices, acceptorIndptr, acceptorIndices, acceptorPosition)
+    return Market(proposerNames, acceptorNames, indptr, indices, entryRank, acceptorIndptr, acceptorIndices,
+                  proposerQuota, acceptorQuota, position, entryPosition, acceptorPosition)
+
+
+# A matching found by the array based engines. Participants are numbered in file order.
+#   proposer[p]: acceptor matched with proposer p, or -1
+#   acceptor[a]: proposer matched with acceptor a, or -1
+#   proposerRank[p], acceptorRank[a]: 1 based position of the partner in their own list, 0 if unmatched
+#     (the position as written when the engine is given the Market's position and entryPosition)
+Matching = namedtuple('Matching', ['proposer', 'acceptor', 'proposerRank', 'acceptorRank'])
+
+
+def galeShapley(indptr, indices, entryRank, acceptorCt, position=None, entryPosition=None, trace=None):
+    """
+    Proposer optimal stable matching on the arrays of a Market.
+
+    Free proposers wait in a queue; each one proposes down its own list until someone accepts,
+    and a dumped proposer rejoins the back of the queue, exactly as in doStableMatch. Since
+    entryRank already holds the acceptor's opinion of every proposal, each proposal costs O(1).
+    The ranks of the Matching come from position and entryPosition when given. trace, when
+    given, is called as trace(p, a, accepted, dumped) for every proposal, with dumped the
+    proposer a lets go of (-1 if none), and as trace(p, -1, False, -1) when p runs out of
+    choices. Returns a Matching.
+    """
+    proposerCt = len(indptr) - 1
+    indices = indices.tolist()  # plain ints are much faster to index one at a time
+    ranks = entryRank.tolist()
+    nextEntry = indptr[:-1].tolist()
+    end = indptr[1:].tolist()
+    holder = [-1] * acceptorCt  # proposer each acceptor currently holds
+    holderEntry = [-1] * acceptorCt  # entry of indices that proposal came from
+    holderRank = [proposerCt] * acceptorCt  # anyone unlisted ranks proposerCt and is refused
+
+    free = deque(range(proposerCt))
+    while free:
+        p = free.popleft()
+        k = nextEntry[p]
+        stop = end[p]
+        while k < stop:
+            a = indices[k]
+            if ranks[k] < holderRank[a]:
+                dumped = holder[a]
+                if dumped >= 0:
+                    free.append(dumped)  # previous partner is getting dumped
+                holder[a] = p
+                holderEntry[a] = k
+                holderRank[a] = ranks[k]
+                if trace is not None:
+                    trace(p, a, True, dumped)
+                break
+            if trace is not None:
+                trace(p, a, False, -1)
+            k += 1
+        else:
+            if trace is not None:
+                trace(p, -1, False, -1)
+        nextEntry[p] = k + 1
+
+    acceptor = numpy.array(holder, dtype=numpy.int64)
+    matched = numpy.flatnonzero(acceptor >= 0)
+    proposer = numpy.full(proposerCt, -1, dtype=numpy.int64)
+    proposer[acceptor[matched]] = matched
+    entries = numpy.array(holderEntry, dtype=numpy.int64)[matched]
+    proposerRank = numpy.zeros(proposerCt, dtype=numpy.int64)
+    acceptorRank = numpy.zeros(acceptorCt, dtype=numpy.int64)
+    proposerRank[acceptor[matched]] = entryPositions(indptr, entries, position) + 1
+    acceptorRank[matched] = (entryRank if entryPosition is None else entryPosition)[entries] + 1
+    return Matching(proposer, acceptor, proposerRank, acceptorRank)
+
+
+def entryPositions(indptr, entries, position=None):
+    """0 based position of the given entries in their proposer's list: position[entries], or by
+    default their place in indices."""
+    if position is not None:
+        return position[entries]
+    return entries - indptr[numpy.searchsorted(indptr, entries, side='right') - 1]
+
+
+def greedyMatch(indptr, indices, entryRank, acceptorCt, position=None, entryPosition=None, trace=None):
+    """
+    Greedy matching on the arrays of a Market, as in doGreedyMatch: proposers take
+    turns in file order, and each one takes the first acceptor in its list that is still
+    free and finds it acceptable. Nobody is ever dumped, so a single pass down every list
+    with a boolean taken array costs O(1) per entry. The ranks of the Matching come from
+    position and entryPosition when given. trace is called as in galeShapley, for the
+    proposals to acceptors that are still free. Returns a Matching.
+    """
+    proposerCt = len(indptr) - 1
+    indices = indices.tolist()
+    ranks = entryRank.tolist()
+    bounds = indptr.tolist()
+    taken = [False] * acceptorCt
+    proposer = [-1] * proposerCt
+    acceptor = [-1] * acceptorCt
+    chosen = []  # entry taken by each matched proposer, in proposer order
+
+    for p in range(proposerCt):
+        for k in range(bounds[p], bounds[p + 1]):
+            a = indices[k]
+            if not taken[a] and ranks[k] < proposerCt:
+                taken[a] = True
+                proposer[p] = a
+                acceptor[a] = p
+                chosen.append(k)
+                if trace is not None:
+                    trace(p, a, True, -1)
+                break
+            if trace is not None and not taken[a]:
+                trace(p, a, False, -1)
+        else:
+            if trace is not None:
+                trace(p, -1, False, -1)
+
+    proposer, acceptor = numpy.array(proposer, dtype=numpy.int64), numpy.array(acceptor, dtype=numpy.int64)
+    entries = numpy.array(chosen, dtype=numpy.int64)
+    matched = numpy.flatnonzero(proposer >= 0)
+    proposerRank = numpy.zeros(proposerCt, dtype=numpy.int64)
+    acceptorRank = numpy.zeros(acceptorCt, dtype=numpy.int64)
+    proposerRank[matched] = entryPositions(indptr, entries, position) + 1
+    acceptorRank[proposer[matched]] = (entryRank if entryPosition is None else entryPosition)[entries] + 1
+    return Matching(proposer, acceptor, proposerRank, acceptorRank)
+
+
+# The pairs of a matching where people may have several partners, one entry per pair, sorted
+# by proposer and then by the proposer's preference. Ranks are 1 based.
+Pairs = namedtuple('Pairs', ['proposer', 'acceptor', 'proposerRank', 'acceptorRank'])
+
+
+def deferredAcceptance(indptr, indices, entryRank, proposerQuota, acceptorQuota, position=None, entryPosition=None):
+    """
+    Proposer optimal stable matching when people take up to a quota of partners, e.g.
+    employers hiring several applicants, on the arrays of a Market.
+
+    A proposer with room left proposes down its list until its quota is filled or the list
+    runs out. Each acceptor keeps its tentative partners in a heap with the worst one on top,
+    so deciding whether a proposal displaces someone costs O(log quota). A displaced proposer
+    rejoins the queue. With every quota 1 this is galeShapley. The ranks of the Pairs come
+    from position and entryPosition when given. Returns Pairs.
+    """
+    proposerCt = len(indptr) - 1
+    acceptorCt = len(acceptorQuota)
+    choices = indices.tolist()
+    ranks = entryRank.tolist()
+    nextEntry = indptr[:-1].tolist()
+    end = indptr[1:].tolist()
+    proposerQuota = proposerQuota.tolist()
+    acceptorQuota = acceptorQuota.tolist()
+    held = [0] * proposerCt  # tentative partners of each proposer
+    tentative = [[] for a in range(acceptorCt)]  # heaps of (-rank, proposer, entry)
+    queued = [True] * proposerCt
+
+    free = deque(range(proposerCt))
+    while free:
+        p = free.popleft()
+        queued[p] = False
+        k = nextEntry[p]
+        stop = end[p]
+        while held[p] < proposerQuota[p] and k < stop:
+            a = choices[k]
+            rank = ranks[k]
+            heap = tentative[a]
+            if rank < proposerCt and len(heap) < acceptorQuota[a]:
+                heapq.heappush(heap, (-rank, p, k))
+                held[p] += 1
+            elif heap and rank < -heap[0][0]:
+                dumped = heapq.heapreplace(heap, (-rank, p, k))[1]
+                held[p] += 1
+                held[dumped] -= 1  # the worst tentative partner is getting dumped
+                if not queued[dumped]:
+                    queued[dumped] = True
+                    free.append(dumped)
+            k += 1
+        nextEntry[p] = k
+
+    entries = numpy.array(sorted(k for heap in tentative for rank, p, k in heap), dtype=numpy.int64)
+    proposer = numpy.searchsorted(indptr, entries, side='right') - 1
+    return Pairs(proposer, indices[entries], entryPositions(indptr, entries, position) + 1,
+                 (entryRank if entryPosition is None else entryPosition)[entries] + 1)
+
+
+def printPairs(pairs, proposerNames, acceptorNames):
+    """Like printPairings, with one line per pair."""
+    i = 0
+    for p, name in enumerate(proposerNames):
+        if i == len(pairs.proposer) or pairs.proposer[i] != p:
+            print(name, 'is NOT paired')
+        while i < len(pairs.proposer) and pairs.proposer[i] == p:
+            print(name, pairs.proposerRank[i], 'is paired with', acceptorNames[pairs.acceptor[i]], pairs.acceptorRank[i])
+            i += 1
+
+    print('Total Utility for Proposers:', pairs.proposerRank.sum(), 'and',
+          'Total Utility for those Proposed to:', pairs.acceptorRank.sum(),
+          'for', len(pairs.proposer), 'matchings')
+
+
+def printMatching(matching, proposerNames, acceptorNames):
+    """Same report as printPairings, for a Matching."""
+    for p, name in enumerate(proposerNames):
+        a = matching.proposer[p]
+        if a >= 0:
+            print(name, matching.proposerRank[p], 'is paired with', acceptorNames[a], matching.acceptorRank[a])
+        else:
+            print(name, 'is NOT paired')
+
+    print('Total Utility for Proposers:', matching.proposerRank.sum(), 'and',
+          'Total Utility for those Proposed to:', matching.acceptorRank.sum(),
+          'for', (matching.proposer >= 0).sum(), 'matchings')
+
+
+def stepPrinter(market, heading, refusal):
+    """
+    A trace for galeShapley and greedyMatch that prints every step the way the verbose
+    drivers always have: the proposers still looking, the proposal and its outcome, and
+    the tentative pairs. refusal is the line shown when an acceptor turns a proposal down,
+    formatted with the proposer and acceptor names.
+    """
+    names, acceptorNames = market.proposerNames, market.acceptorNames
+    partner = [-1] * len(names)
+    looking = [True] * len(names)
+
+    def trace(p, a, accepted, dumped):
+        print("Unmatched employers ", [name for q, name in enumerate(names) if looking[q] and partner[q] < 0])
+        if a < 0:
+            print('No more options ' + names[p])
+            looking[p] = False
+            return
+        print(names[p], 'proposes to', acceptorNames[a])
+        if accepted:
+            print('  ', acceptorNames[a], 'accepts the proposal')
+            if dumped >= 0:
+                print('  ', names[dumped], 'gets dumped')
+                partner[dumped] = -1
+            partner[p] = a
+        else:
+            print(refusal.format(proposer=names[p], acceptor=acceptorNames[a]))
+        print(heading)
+        for q, name in enumerate(names):
+            if partner[q] >= 0:
+                print(name, 'is paired with', acceptorNames[partner[q]])
+            else:
+                print(name, 'is NOT paired')
+
+    return trace
+
+
 def doStableMatch(msg,fileTuple):
+    """
+    Prints and returns (as a Matching) the proposer optimal stable matching found by
+    galeShapley. With verbose set, every step is printed as well.
+    """
     print("\n\n------- Gale Shapley Algorithm -------")
     print(msg+" working with files ", fileTuple)
-    proposerList = parseFile(fileTuple[0])
-    proposerPref = dict()
-    # each item in hr_list is a person and their priority list
-    for person, priority in proposerList:
-        proposerPref[person] = Proposer(person, priority)
-    unmatched = list(proposerPref.keys())
-
-    acceptor_list = parseFile(fileTuple[1])
-    acceptors = dict()
-    # each item in applicant_list is a person and their priority list
-    for person, priority in acceptor_list:
-        acceptors[person] = Acceptor(person, priority)
-    verbose = fileTuple[2]
-    ############################### the real algorithm ##################################
-    while len(unmatched) > 0:
-        if verbose:
-            print("Unmatched employers ", unmatched)
-        m = proposerPref[unmatched[0]]  # pick arbitrary unmatched proposer
-        n = m.nextProposal()
-        if n is None:
-            if verbose:
-                print('No more options ' + str(m))
-            unmatched.pop(0)
-            continue
-        who = acceptors[n]  # identify highest-rank applicant to which m has not yet proposed
-        if verbose: print(m.name, 'proposes to', who.name)
-
-        if who.evaluateProposal(m.name):
-            if verbose: print('  ', who.name, 'accepts the proposal')
-
-            if who.partner:
-                # previous partner is getting dumped
-                oldMatch = proposerPref[who.partner]
-                if verbose:
-                    print('  ', oldMatch.name, 'gets dumped')
-
-                oldMatch.partner = None
-                oldMatch.rank = 0
-                unmatched.append(oldMatch.name)
-
-            unmatched.pop(0)
-            who.partner = m.name
-            m.partner = who.name
-            m.rank = m.proposalIndex
-        else:
-            if verbose:
-                print('  ', who.name, 'rejects the proposal')
+    market = loadMarket(fileTuple[0], fileTuple[1])
+    trace = None
+    if fileTuple[2]:
+        trace = stepPrinter(market, "Tentative Pairings are as follows:", "   {acceptor} rejects the proposal")
+    matching = galeShapley(market.indptr, market.indices, market.entryRank, len(market.acceptorNames),
+                           market.position, market.entryPosition, trace)
+    print("Final Pairings are as follows:")
+    printMatching(matching, market.proposerNames, market.acceptorNames)
+    return matching
 
-        if verbose:
-            print("Tentative Pairings are as follows:")
-            printPairings(proposerPref, acceptors)
 
+def doCapacitatedMatch(msg,fileTuple):
+    """
+    Prints and returns (as Pairs) the proposer optimal stable matching with the quotas
+    given in the files, e.g. employers that hire several applicants.
+    """
+    print("\n\n------- Deferred Acceptance with Quotas -------")
+    print(msg+" working with files ", fileTuple)
+    market = loadMarket(fileTuple[0], fileTuple[1])
+    pairs = deferredAcceptance(market.indptr, market.indices, market.entryRank,
+                               market.proposerQuota, market.acceptorQuota, market.position, market.entryPosition)
+    print("Final Pairings are as follows:")
+    printPairs(pairs, market.proposerNames, market.acceptorNames)
+    return pairs
+
+
+def doGreedyMatch(msg,fileTuple):
+    """
+    Prints and returns (as a Matching) the greedy matching found by greedyMatch. With
+    verbose set, every step is printed as well.
+    """
+    print("\n\n------- Greedy Algorithm -------")
+    print(msg+" working with files ", fileTuple)
+    market = loadMarket(fileTuple[0], fileTuple[1])
+    trace = None
+    if fileTuple[2]:
+        trace = stepPrinter(market, "Pairings are as follows:", "   {proposer} wasn't on preference list for {acceptor}")
+    matching = greedyMatch(market.indptr, market.indices, market.entryRank, len(market.acceptorNames),
+                           market.position, market.entryPosition, trace)
     print("Final Pairings are as follows:")
-    printPairings(proposerPref, acceptors)
+    printMatching(matching, market.proposerNames, market.acceptorNames)
+    return matching
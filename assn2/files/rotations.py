@@ -0,0 +1,301 @@
+"""
+Every stable matching of a market, through its rotation poset (Gusfield and Irving).
+
+Starting from the proposer optimal matching, a rotation is a cycle of proposers
+p0, p1, ..., pk where each pi moves down to the partner of p(i+1), and every acceptor in it
+trades up. Eliminating rotations one at a time walks from the proposer optimal matching to the
+acceptor optimal one. The rotations are partially ordered, and the stable matchings are exactly
+the closed sets of that poset: apply a set of rotations that contains everything that must
+precede its members, and a stable matching comes out.
+
+So all stable matchings can be streamed from the poset, and the egalitarian one (least total
+rank over both sides) is a minimum weight closure, found with one min-cut.
+"""
+import bisect
+from collections import namedtuple
+
+import numpy
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order, maximum_flow
+
+import matches
+
+# One rotation: proposers[i] moves from acceptors[i] to acceptors[i + 1] (cyclically).
+# weight is the change in the total rank, over both sides, when it is eliminated.
+Rotation = namedtuple('Rotation', ['proposers', 'acceptors', 'weight'])
+
+
+class RotationPoset:
+    """
+    The rotations of a matches.Market, found in O(total length of the preference lists) from
+    the proposer optimal and acceptor optimal matchings. Rotations are numbered in the order
+    they were eliminated, which is a topological order of the poset.
+    """
+
+    def __init__(self, market):
+        self.market = market
+        proposerCt, acceptorCt = len(market.proposerNames), len(market.acceptorNames)
+        proposer_best = matches.galeShapley(market.indptr, market.indices, market.entryRank, acceptorCt)
+        acceptor_best = matches.galeShapley(market.acceptorIndptr, market.acceptorIndices,
+                                            matches.inverseRanks(market.acceptorIndptr, market.acceptorIndices,
+                                                                 market.indptr, market.indices),
+                                            proposerCt)
+        self.first = proposer_best.proposer  # acceptor of each proposer in the proposer optimal matching
+        self.last = acceptor_best.acceptor  # ... and in the acceptor optimal one
+
+        self.choices = [market.indices[market.indptr[p]:market.indptr[p + 1]].tolist() for p in range(proposerCt)]
+        self.proposer_rank = [{a: i for i, a in enumerate(c)} for c in self.choices]  # index in choices
+        # 0 based positions in the lists as written, which the weights and totals count
+        self.proposer_position = [dict(zip(c, market.position[market.indptr[p]:market.indptr[p + 1]].tolist()))
+                                  for p, c in enumerate(self.choices)]
+        self.acceptor_rank = [dict(zip(market.acceptorIndices[start:end].tolist(),
+                                       market.acceptorPosition[start:end].tolist()))
+                              for start, end in zip(market.acceptorIndptr[:-1], market.acceptorIndptr[1:])]
+        self.rotations = []
+        self.predecessors = []  # rotations that must be eliminated before each rotation
+        self._find_rotations()
+
+    def _find_rotations(self):
+        """
+        Walks the proposer optimal matching towards the acceptor optimal one. next(p) is the
+        partner of the first acceptor after p's partner in p's list who would rather have p
+        than her partner; following next from a proposer that can still move down must
+        cycle, and the cycle is an exposed rotation. The walk is kept on a stack, so after
+        eliminating a rotation it resumes where it was, and each proposer's scan of its list
+        only moves forward.
+        """
+        proposerCt = len(self.first)
+        partner = self.first.tolist()  # current acceptor of each proposer
+        holder = [-1] * len(self.market.acceptorNames)  # current proposer of each acceptor
+        for p, a in enumerate(partner):
+            if a >= 0:
+                holder[a] = p
+        scan = [self.proposer_rank[p][a] + 1 if a >= 0 else 0 for p, a in enumerate(partner)]
+        # (rank of partner, rotation that brought them) for each acceptor, improving over time
+        self.acceptor_history = [[(self.acceptor_rank[a][p], -1)] if p >= 0 else [] for a, p in enumerate(holder)]
+        self._negated_ranks = [[-r for r, k in history] for history in self.acceptor_history]  # for bisect
+        last_rotation = [-1] * proposerCt  # latest rotation moving each proposer
+
+        def successor(p):
+            # the first acceptor after p's partner who prefers p to her own partner
+            choices, ranks = self.choices[p], self.acceptor_rank
+            while True:
+                a = choices[scan[p]]
+                if holder[a] >= 0 and p in ranks[a] and ranks[a][p] < ranks[a][holder[a]]:
+                    return a
+                scan[p] += 1
+
+        stack = []
+        on_stack = [False] * proposerCt
+        for start in range(proposerCt):
+            while partner[start] != self.last[start]:
+                if not stack:
+                    stack.append(start)
+                    on_stack[start] = True
+                q = holder[successor(stack[-1])]
+                if not on_stack[q]:
+                    stack.append(q)
+                    on_stack[q] = True
+                    continue
+
+                cycle = []
+                while not cycle or cycle[-1] != q:
+                    cycle.append(stack.pop())
+                    on_stack[cycle[-1]] = False
+                cycle.reverse()
+                self._eliminate(cycle, partner, holder, scan, last_rotation)
+
+    def _eliminate(self, cycle, partner, holder, scan, last_rotation):
+        """Records the rotation on the proposers in cycle, with its predecessors, and applies it."""
+        index = len(self.rotations)
+        acceptors = [partner[p] for p in cycle]
+        moves_to = acceptors[1:] + acceptors[:1]
+        weight = 0
+        predecessors = set()
+        for p, old, new in zip(cycle, acceptors, moves_to):
+            weight += self.proposer_position[p][new] - self.proposer_position[p][old]
+            weight += self.acceptor_rank[new][p] - self.acceptor_rank[new][holder[new]]
+            # The previous rotation moving p comes first
+            if last_rotation[p] >= 0:
+                predecessors.add(last_rotation[p])
+            last_rotation[p] = index
+            # p skipped every acceptor between old and new because she had someone better;
+            # the rotation that first gave her someone better than p comes first
+            for a in self.choices[p][self.proposer_rank[p][old] + 1:self.proposer_rank[p][new]]:
+                rank = self.acceptor_rank[a].get(p)
+                history = self.acceptor_history[a]
+                if rank is None or not history:
+                    continue
+                # history ranks only decrease; find the first entry below rank
+                i = bisect.bisect_left(self._negated_ranks[a], -rank + 1)
+                if i < len(history) and history[i][1] >= 0:
+                    predecessors.add(history[i][1])
+
+        for p, new in zip(cycle, moves_to):
+            partner[p] = new
+            holder[new] = p
+            scan[p] = self.proposer_rank[p][new] + 1
+            self.acceptor_history[new].append((self.acceptor_rank[new][p], index))
+            self._negated_ranks[new].append(-self.acceptor_rank[new][p])
+        self.rotations.append(Rotation(cycle, acceptors, weight))
+        self.predecessors.append(sorted(predecessors))
+
+    def matching(self, included):
+        """
+        The stable matching reached by eliminating the rotations marked in included, which
+        must be a closed set. Returns the acceptor of each proposer (-1 if unmatched).
+        """
+        partner = self.first.copy()
+        for index in numpy.flatnonzero(included):
+            rotation = self.rotations[index]
+            partner[rotation.proposers] = rotation.acceptors[1:] + rotation.acceptors[:1]
+        return partner
+
+    def matchings(self):
+        """
+        Streams every stable matching, each as the acceptor of each proposer. Rotations are
+        decided in topological order: leaving one out is always possible, and putting one in is
+        possible once all its predecessors are in, so every path of decisions ends in a distinct
+        closed set and the work per matching is O(number of rotations).
+        """
+        count = len(self.rotations)
+        included = numpy.zeros(count, dtype=bool)
+        partner = self.first.copy()
+        # Each frame is (rotation index, whether it has been tried with the rotation included)
+        stack = [(0, False)]
+        while stack:
+            index, tried = stack.pop()
+            if index == count:
+                yield partner.copy()
+                continue
+            rotation = self.rotations[index]
+            if tried:
+                # undo the rotation and leave it out this time
+                partner[rotation.proposers] = rotation.acceptors
+                included[index] = False
+                stack.append((index + 1, False))
+            elif all(included[k] for k in self.predecessors[index]):
+                partner[rotation.proposers] = rotation.acceptors[1:] + rotation.acceptors[:1]
+                included[index] = True
+                stack.append((index, True))
+                stack.append((index + 1, False))
+            else:
+                stack.append((index + 1, False))
+
+    def _closure(self, rotations, successors=False):
+        """The rotations in rotations and everything before them (or after them)."""
+        edges = self.predecessors
+        if successors:
+            edges = [[] for k in self.rotations]
+            for k, before in enumerate(self.predecessors):
+                for j in before:
+                    edges[j].append(k)
+        closed = numpy.zeros(len(self.rotations), dtype=bool)
+        pending = list(rotations)
+        while pending:
+            k = pending.pop()
+            if not closed[k]:
+                closed[k] = True
+                pending.extend(edges[k])
+        return closed
+
+    def egalitarian(self):
+        """
+        The stable matching with the least total rank over both sides. Eliminating a closed
+        set adds up its rotation weights, so this is a minimum weight closure: a min-cut
+        between rotations with negative weight (worth taking, on the source side) and
+        positive weight (on the sink side), where a rotation can only be taken along with its
+        predecessors. Returns (acceptor of each proposer, rotations included).
+        """
+        count = len(self.rotations)
+        weights = [rotation.weight for rotation in self.rotations]
+        if min(weights, default=0) >= 0:
+            # Nothing is worth eliminating
+            return self.first.copy(), numpy.zeros(count, dtype=bool)
+        # Taking every negative rotation's source edge is a cut, so no minimum cut costs more
+        # than their total, and one more than that can stand for an infinite capacity
+        infinite = sum(-w for w in weights if w < 0) + 1
+        if infinite > numpy.iinfo(numpy.int32).max:
+            raise ValueError("rotation weights too large for the 32 bit capacities of maximum_flow")
+        source, sink = count, count + 1
+        edges = {}
+        for k, w in enumerate(weights):
+            if w < 0:
+                edges[source, k] = -w
+            elif w > 0:
+                edges[k, sink] = w
+            for j in self.predecessors[k]:
+                edges[k, j] = infinite
+        rows, cols = zip(*edges)
+        capacity = csr_matrix((numpy.array(list(edges.values()), dtype=numpy.int32), (rows, cols)),
+                              shape=(count + 2, count + 2))
+        flow = maximum_flow(capacity, source, sink).flow
+        residual = (capacity - flow).tocsr()
+        residual.data = (residual.data > 0).astype(numpy.int32)
+        residual.eliminate_zeros()
+        reached = breadth_first_order(residual, source, return_predecessors=False)
+        included = numpy.zeros(count, dtype=bool)
+        included[reached[reached < count]] = True
+        return self.matching(included), included
+
+    def minimum_regret(self):
+        """
+        The stable matching whose worst off person, on either side, is as well off as possible.
+        For a bound k on the 1 based rank anybody gets, every rotation moving a proposer past
+        rank k is ruled out along with everything after it, and every acceptor ranking her
+        first partner past k needs the rotation that first brings her within k, along with
+        everything before it. The least k where those two sets do not meet wins, and the
+        smallest closed set meeting the needs is its matching.
+        Returns (acceptor of each proposer, rotations included, regret).
+        """
+        # the rank (1 based) each rotation moves each of its proposers to
+        moved_to = [max(self.proposer_position[p][a] + 1
+                        for p, a in zip(rotation.proposers, rotation.acceptors[1:] + rotation.acceptors[:1]))
+                    for rotation in self.rotations]
+        start = [self.proposer_position[p][a] + 1 for p, a in enumerate(self.first.tolist()) if a >= 0]
+        candidates = sorted({r + 1 for history in self.acceptor_history for r, k in history} | set(moved_to) |
+                            set(start))
+        for bound in candidates:
+            if start and max(start) > bound:
+                continue
+            needed = []
+            feasible = True
+            for history in self.acceptor_history:
+                if history and history[0][0] + 1 > bound:
+                    within = [k for r, k in history if r + 1 <= bound]
+                    if not within:
+                        feasible = False
+                        break
+                    needed.append(within[0])
+            if not feasible:
+                continue
+            included = self._closure(needed)
+            excluded = self._closure([k for k, r in enumerate(moved_to) if r > bound], successors=True)
+            if not (included & excluded).any():
+                return self.matching(included), included, bound
+        return self.first.copy(), numpy.zeros(len(self.rotations), dtype=bool), max(start, default=0)
+
+    def total_rank(self, partner):
+        """Total 1 based rank of the partners over both sides, as in printPairings."""
+        total = 0
+        for p, a in enumerate(partner.tolist()):
+            if a >= 0:
+                total += self.proposer_position[p][a] + self.acceptor_rank[a][p] + 2
+        return total
+
+
+if __name__ == '__main__':
+    from Graph import Graph, files
+
+    for file_tuple in files[::2]:
+        market = matches.loadMarket(file_tuple[0], file_tuple[1])
+        poset = RotationPoset(market)
+        print("\n\n------- Stable Matchings -------")
+        print("Working with files ", file_tuple)
+        print(f"Rotations: {len(poset.rotations)}, stable matchings: {sum(1 for m in poset.matchings())}")
+        for name, partner in (("Employer optimal", poset.first), ("Applicant optimal", poset.last),
+                              ("Egalitarian", poset.egalitarian()[0]), ("Minimum regret", poset.minimum_regret()[0])):
+            pairs = ", ".join(f"{market.proposerNames[p]}-{market.acceptorNames[a]}"
+                              for p, a in enumerate(partner.tolist()) if a >= 0)
+            print(f"{name}: total rank {poset.total_rank(partner)}: {pairs}")
+        Graph(file_tuple).do_flow("Centralized optimum, which need not be stable:", file_tuple)
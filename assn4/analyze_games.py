@@ -0,0 +1,167 @@
+"""
+Batch analysis of normal form games stored in the prog4*.txt format.
+
+Example:
+    python analyze_games.py "games/*.txt" --analyses pure_ne pareto --format csv --cache cache.json
+
+Each game file is analyzed in a worker process and one result line is written per file.
+With --cache, files whose size and modification time are unchanged since the last run
+are not reanalyzed; their cached results are written out instead.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+from multiprocessing import Pool
+
+from assn4 import NormalFormGame
+
+# Analysis name -> NormalFormGame method
+ANALYSES = {
+    'dominance': 'find_strongly_dominated_strategies',
+    'pure_ne': 'find_pure_strategy_equilibria',
+    'pareto': 'find_pareto_optimal_solutions',
+    'maximin': 'find_maximin_strategy',
+    'minimax_regret': 'find_minimax_strategy',
+}
+
+
+def to_json(value):
+    """Convert the namedtuple results of NormalFormGame into plain JSON values."""
+    if hasattr(value, '_asdict'):
+        return {key: to_json(item) for key, item in value._asdict().items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    return value
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def analyze_file(job):
+    """Worker: parse one game file and run the requested analyses on it."""
+    path, analyses = job
+    row = {'file': path}
+    try:
+        row['stamp'] = file_stamp(path)
+        game = NormalFormGame.from_file(path)
+        for name in analyses:
+            row[name] = to_json(getattr(game, ANALYSES[name])(verbose=False))
+    except (OSError, ValueError) as e:
+        row['error'] = str(e)
+    return row
+
+
+def load_cache(cache_path):
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_cache(cache_path, cache):
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(cache, f)
+    os.replace(temp_path, cache_path)  # never leave a half written cache behind
+
+
+def cached_result(cache, path, analyses):
+    entry = cache.get(path)
+    if entry is None or 'error' in entry:
+        return None
+    try:
+        if entry['stamp'] != file_stamp(path):
+            return None
+    except OSError:
+        return None  # gone or unreadable: the worker reports it as an error row
+    if any(name not in entry for name in analyses):
+        return None
+    return entry
+
+
+def merge_entry(entry, row):
+    # Keep analyses cached for the same version of the file that were not requested this time
+    if entry is None or 'error' in entry or 'error' in row or entry['stamp'] != row['stamp']:
+        return row
+    return {**entry, **row}
+
+
+def write_row(writer, out_format, row, analyses):
+    if out_format == 'jsonl':
+        record = {'file': row['file']}
+        if 'error' in row:
+            record['error'] = row['error']
+        else:
+            record.update((name, row[name]) for name in analyses)
+        writer.write(json.dumps(record) + '\n')
+    else:
+        writer.writerow([row['file'], row.get('error', '')] +
+                        [json.dumps(row[name]) if name in row else '' for name in analyses])
+
+
+def run(paths, analyses, out, out_format='jsonl', cache_path=None, jobs=None, chunksize=64):
+    """Analyze every game in paths, streaming one result per file to out in input order."""
+    cache = load_cache(cache_path)
+    # Looked up once, so a file that changes during the run cannot move it between the two lists
+    cached = [cached_result(cache, path, analyses) for path in paths]
+    pending = [path for path, row in zip(paths, cached) if row is None]
+
+    writer = out if out_format == 'jsonl' else csv.writer(out)
+    if out_format == 'csv':
+        writer.writerow(['file', 'error'] + list(analyses))
+
+    if jobs == 1 or len(pending) < 2:
+        fresh = map(analyze_file, [(path, analyses) for path in pending])
+        pool = None
+    else:
+        pool = Pool(jobs)
+        fresh = pool.imap(analyze_file, [(path, analyses) for path in pending], chunksize=chunksize)
+
+    try:
+        for path, row in zip(paths, cached):
+            if row is None:
+                row = next(fresh)
+                cache[path] = merge_entry(cache.get(path), row)
+            write_row(writer, out_format, row, analyses)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if cache_path:
+        save_cache(cache_path, cache)
+    return len(paths) - len(pending)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze many normal form games stored in the prog4 format.")
+    parser.add_argument('patterns', nargs='+', help="glob patterns of game files, e.g. 'games/**/*.txt'")
+    parser.add_argument('--analyses', nargs='+', choices=list(ANALYSES), default=list(ANALYSES),
+                        help="analyses to run (default: all)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl', help="output format")
+    parser.add_argument('--output', '-o', help="output file (default: stdout)")
+    parser.add_argument('--cache', help="JSON file of results from earlier runs")
+    parser.add_argument('--jobs', '-j', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--chunksize', type=int, default=64, help="games handed to a worker at a time")
+    args = parser.parse_args(argv)
+
+    paths = sorted({path for pattern in args.patterns for path in glob.glob(pattern, recursive=True)})
+    if not paths:
+        parser.error("no game files matched")
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        skipped = run(paths, args.analyses, out, args.format, args.cache, args.jobs, args.chunksize)
+    finally:
+        if args.output:
+            out.close()
+    print(f"Analyzed {len(paths) - skipped} games, {skipped} up to date in cache.", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
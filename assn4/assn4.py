@@ -1,13 +1,86 @@
 import random
 import copy
+from collections import namedtuple
+
+# Result types returned by the analysis methods of NormalFormGame
+PlayerPair = namedtuple('PlayerPair', ['row', 'col'])  # one result per player
+Outcome = namedtuple('Outcome', ['row_action', 'col_action', 'row_payoff', 'col_payoff'])
+StrategyChoice = namedtuple('StrategyChoice', ['strategy', 'value', 'values'])  # strategy is None on a full tie
 
 class NormalFormGame:
     def __init__(self, num_row_actions, num_col_actions, row_rewards, col_rewards):
+        self._cache = {}
         self.num_row_actions = num_row_actions
         self.num_col_actions = num_col_actions
         self.row_rewards = row_rewards  # 2D list for row player rewards
         self.col_rewards = col_rewards  # 2D list for column player rewards
 
+    @property
+    def row_rewards(self):
+        return self._row_rewards
+
+    @row_rewards.setter
+    def row_rewards(self, rewards):
+        self._row_rewards = rewards
+        self.invalidate_cache()
+
+    @property
+    def col_rewards(self):
+        return self._col_rewards
+
+    @col_rewards.setter
+    def col_rewards(self, rewards):
+        self._col_rewards = rewards
+        self.invalidate_cache()
+
+    def set_payoff(self, r, c, row_payoff, col_payoff):
+        """Change the payoffs of a single outcome and drop the derived arrays."""
+        self._row_rewards[r][c] = row_payoff
+        self._col_rewards[r][c] = col_payoff
+        self.invalidate_cache()
+
+    def invalidate_cache(self):
+        """Forget the derived arrays. Call this after editing the payoff lists in place."""
+        self._cache.clear()
+
+    def _cached(self, key, compute):
+        # Derived arrays are computed on first use and shared by every analysis
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    # Best payoff the row player can get against each column
+    @property
+    def col_maxima(self):
+        return self._cached('col_maxima', lambda: [max(column) for column in zip(*self._row_rewards)])
+
+    # Best payoff the column player can get against each row
+    @property
+    def row_maxima(self):
+        return self._cached('row_maxima', lambda: [max(row) for row in self._col_rewards])
+
+    # Worst payoff of each row player strategy
+    @property
+    def row_minima(self):
+        return self._cached('row_minima', lambda: [min(row) for row in self._row_rewards])
+
+    # Worst payoff of each column player strategy
+    @property
+    def col_minima(self):
+        return self._cached('col_minima', lambda: [min(column) for column in zip(*self._col_rewards)])
+
+    # row_best_response[r][c] is True when r is a best response of the row player to column c
+    @property
+    def row_best_response(self):
+        return self._cached('row_best_response', lambda: [
+            [value == best for value, best in zip(row, self.col_maxima)] for row in self._row_rewards])
+
+    # col_best_response[r][c] is True when c is a best response of the column player to row r
+    @property
+    def col_best_response(self):
+        return self._cached('col_best_response', lambda: [
+            [value == best for value in row] for row, best in zip(self._col_rewards, self.row_maxima)])
+
     @classmethod
     def from_file(cls, file_path):
         with open(file_path, 'r') as f:
@@ -30,33 +103,37 @@ class NormalFormGame:
 
         return cls(num_row_actions, num_col_actions, row_rewards_matrix, col_rewards_matrix)
     
-    def find_strongly_dominated_strategies(self):
+    def find_strongly_dominated_strategies(self, verbose=True):
         row_dominated = []
         col_dominated = []
-        
+        col_strategies = list(zip(*self.col_rewards))  # payoffs of each column strategy, one entry per row
+
         for r1 in range(self.num_row_actions):
             for r2 in range(self.num_row_actions):
                 if r1 != r2:  # Compare only different strategies
-                    if all(self.row_rewards[r2][c] > self.row_rewards[r1][c] for c in range(self.num_col_actions)):
-                        if r1 not in row_dominated:  # Avoid duplicates
-                            row_dominated.append(r1)
+                    if all(better > worse for better, worse in zip(self.row_rewards[r2], self.row_rewards[r1])):
+                        row_dominated.append(r1)
+                        break
 
         for c1 in range(self.num_col_actions):
             for c2 in range(self.num_col_actions):
                 if c1 != c2:  # Compare only different strategies
-                    if all(self.col_rewards[r][c2] > self.col_rewards[r][c1] for r in range(self.num_row_actions)):
-                        if c1 not in col_dominated:  # Avoid duplicates
-                            col_dominated.append(c1)
+                    if all(better > worse for better, worse in zip(col_strategies[c2], col_strategies[c1])):
+                        col_dominated.append(c1)
+                        break
+
+        if verbose:
+            if not row_dominated:
+                print("No strongly dominated strategies for Row Player.")
+            else:
+                print("Strongly Dominated Strategies for Row Player:", row_dominated)
 
-        if not row_dominated:
-            print("No strongly dominated strategies for Row Player.")
-        else:
-            print("Strongly Dominated Strategies for Row Player:", row_dominated)
+            if not col_dominated:
+                print("No strongly dominated strategies for Column Player.")
+            else:
+                print("Strongly Dominated Strategies for Column Player:", col_dominated)
 
-        if not col_dominated:
-            print("No strongly dominated strategies for Column Player.")
-        else:
-            print("Strongly Dominated Strategies for Column Player:", col_dominated)
+        return PlayerPair(row_dominated, col_dominated)
 
     def is_weakly_dominated(self, player_rewards, strategy_idx, other_strategy_idx, opponent_actions):
         strictly_better_in_at_least_one = False
@@ -135,110 +212,119 @@ class NormalFormGame:
         for col in local_col_rewards:
             print(col)
 
-    def find_pure_strategy_equilibria(self):
+    def find_pure_strategy_equilibria(self, verbose=True):
         equilibria = []
 
         for r in range(self.num_row_actions):
+            row_best = self.row_best_response[r]
+            col_best = self.col_best_response[r]
             for c in range(self.num_col_actions):
-                # Check if row player is playing optimally for this column
-                row_player_best_response = all(
-                    self.row_rewards[r][c] >= self.row_rewards[r_other][c]
-                    for r_other in range(self.num_row_actions)
-                )
-
-                # Check if column player is playing optimally for this row
-                col_player_best_response = all(
-                    self.col_rewards[r][c] >= self.col_rewards[r][c_other]
-                    for c_other in range(self.num_col_actions)
-                )
-
-                # If both players are playing optimally, we have a Nash equilibrium
-                if row_player_best_response and col_player_best_response:
-                    equilibria.append((self.row_rewards[r][c], self.col_rewards[r][c]))
-
-        if equilibria:
-            print("Pure Strategy Nash Equilibria (Row Player, Column Player):", equilibria)
-        else:
-            print("No Pure Strategy Nash Equilibria found.")
-
-    def find_pareto_optimal_solutions(self):
-        pareto_optimal = []
-
-        for r1 in range(self.num_row_actions):
-            for c1 in range(self.num_col_actions):
-                is_pareto_optimal = True
-                for r2 in range(self.num_row_actions):
-                    for c2 in range(self.num_col_actions):
-                        # Check if (r2, c2) dominates (r1, c1)
-                        if (self.row_rewards[r2][c2] >= self.row_rewards[r1][c1] and
-                            self.col_rewards[r2][c2] >= self.col_rewards[r1][c1] and
-                            (self.row_rewards[r2][c2] > self.row_rewards[r1][c1] or
-                             self.col_rewards[r2][c2] > self.col_rewards[r1][c1])):
-                            is_pareto_optimal = False
-                            break
-                    if not is_pareto_optimal:
-                        break
-
-                if is_pareto_optimal:
-                    pareto_optimal.append((self.row_rewards[r1][c1], self.col_rewards[r1][c1]))
-
-        if pareto_optimal:
-            print("Pareto Optimal Solutions (Row Player Payoff, Column Player Payoff):", pareto_optimal)
-        else:
-            print("No Pareto Optimal Solutions found.")
-
-    def find_minimax_strategy(self):
-        row_max_regret = []
-        for r in range(self.num_row_actions):
-            max_regret = float('-inf')
-            for c in range(self.num_col_actions):
-                best_possible_payoff = max(self.row_rewards[r2][c] for r2 in range(self.num_row_actions))  # Best row reward for this column
-                actual_payoff = self.row_rewards[r][c]
-                regret = best_possible_payoff - actual_payoff
-                max_regret = max(max_regret, regret)
-            row_max_regret.append(max_regret)
-
-        if all(r == row_max_regret[0] for r in row_max_regret):
-            print(f"Row Player: All strategies have the same minimax regret: {row_max_regret[0]}. No single best option.")
-        else:
-            row_minimax_strategy = min(range(self.num_row_actions), key=lambda r: row_max_regret[r])
-            print(f"Row Player's Minimax Strategy: {row_minimax_strategy} (Minimized Maximum Regret: {row_max_regret[row_minimax_strategy]})")
-
-        # Calculate minimax strategy for the Column Player
-        col_max_regret = []
-        for c in range(self.num_col_actions):
-            max_regret = float('-inf')
-            for r in range(self.num_row_actions):
-                best_possible_payoff = max(self.col_rewards[r][c2] for c2 in range(self.num_col_actions))  # Best column reward for this row
-                actual_payoff = self.col_rewards[r][c]
-                regret = best_possible_payoff - actual_payoff
-                max_regret = max(max_regret, regret)
-            col_max_regret.append(max_regret)
-
-        if all(c == col_max_regret[0] for c in col_max_regret):
-            print(f"Column Player: All strategies have the same minimax regret: {col_max_regret[0]}. No single best option.")
-        else:
-            col_minimax_strategy = min(range(self.num_col_actions), key=lambda c: col_max_regret[c])
-            print(f"Column Player's Minimax Strategy: {col_minimax_strategy} (Minimized Maximum Regret: {col_max_regret[col_minimax_strategy]})")
-
-    def find_maximin_strategy(self):
-        row_minimums = [min(self.row_rewards[r]) for r in range(self.num_row_actions)] 
-        row_maximin_value = max(row_minimums) 
-
-        if all(value == row_minimums[0] for value in row_minimums):
-            print(f"Row Player: All strategies have the same maximin value: {row_maximin_value}. No single best option.")
-        else:
-            row_maximin_strategy = row_minimums.index(row_maximin_value) 
-            print(f"Row Player's Maximin Strategy: {row_maximin_strategy} (Maximum of Minimum Payoff: {row_maximin_value})")
-
-        col_minimums = [min([self.col_rewards[r][c] for r in range(self.num_row_actions)]) for c in range(self.num_col_actions)]
-        col_maximin_value = max(col_minimums) 
-
-        if all(value == col_minimums[0] for value in col_minimums):
-            print(f"Column Player: All strategies have the same maximin value: {col_maximin_value}. No single best option.")
-        else:
-            col_maximin_strategy = col_minimums.index(col_maximin_value) 
-            print(f"Column Player's Maximin Strategy: {col_maximin_strategy} (Maximum of Minimum Payoff: {col_maximin_value})")
+                # Both players must be playing a best response to each other
+                if row_best[c] and col_best[c]:
+                    equilibria.append(Outcome(r, c, self.row_rewards[r][c], self.col_rewards[r][c]))
+
+        if verbose:
+            if equilibria:
+                print("Pure Strategy Nash Equilibria (Row Player, Column Player):",
+                      [(e.row_payoff, e.col_payoff) for e in equilibria])
+            else:
+                print("No Pure Strategy Nash Equilibria found.")
+
+        return equilibria
+
+    def find_pareto_optimal_solutions(self, verbose=True):
+        # Sweep the outcomes from the best row payoff down. An outcome is dominated when an outcome
+        # with a strictly better row payoff has a column payoff at least as good, or an outcome with
+        # the same row payoff has a strictly better column payoff.
+        outcomes = sorted(((self.row_rewards[r][c], self.col_rewards[r][c], r, c)
+                           for r in range(self.num_row_actions) for c in range(self.num_col_actions)),
+                          key=lambda o: (-o[0], -o[1]))
+        optimal = set()
+        best_col_above = float('-inf')  # best column payoff among strictly better row payoffs
+        i = 0
+        while i < len(outcomes):
+            row_payoff, group_best_col = outcomes[i][0], outcomes[i][1]
+            j = i
+            while j < len(outcomes) and outcomes[j][0] == row_payoff:
+                col_payoff, r, c = outcomes[j][1], outcomes[j][2], outcomes[j][3]
+                if col_payoff == group_best_col and col_payoff > best_col_above:
+                    optimal.add((r, c))
+                j += 1
+            best_col_above = max(best_col_above, group_best_col)
+            i = j
+
+        pareto_optimal = [Outcome(r, c, self.row_rewards[r][c], self.col_rewards[r][c])
+                          for r in range(self.num_row_actions) for c in range(self.num_col_actions)
+                          if (r, c) in optimal]
+
+        if verbose:
+            if pareto_optimal:
+                print("Pareto Optimal Solutions (Row Player Payoff, Column Player Payoff):",
+                      [(o.row_payoff, o.col_payoff) for o in pareto_optimal])
+            else:
+                print("No Pareto Optimal Solutions found.")
+
+        return pareto_optimal
+
+    def find_minimax_strategy(self, verbose=True):
+        # Regret is the gap to the best payoff the player could have had against the same opponent action
+        col_maxima = self.col_maxima
+        row_max_regret = [max(best - actual for best, actual in zip(col_maxima, row))
+                          for row in self.row_rewards]
+        row_choice = self._choose(row_max_regret, min)
+
+        row_maxima = self.row_maxima
+        col_max_regret = [max(best - actual for best, actual in zip(row_maxima, column))
+                          for column in zip(*self.col_rewards)]
+        col_choice = self._choose(col_max_regret, min)
+
+        if verbose:
+            if row_choice.strategy is None:
+                print(f"Row Player: All strategies have the same minimax regret: {row_choice.value}. No single best option.")
+            else:
+                print(f"Row Player's Minimax Strategy: {row_choice.strategy} (Minimized Maximum Regret: {row_choice.value})")
+
+            if col_choice.strategy is None:
+                print(f"Column Player: All strategies have the same minimax regret: {col_choice.value}. No single best option.")
+            else:
+                print(f"Column Player's Minimax Strategy: {col_choice.strategy} (Minimized Maximum Regret: {col_choice.value})")
+
+        return PlayerPair(row_choice, col_choice)
+
+    def find_maximin_strategy(self, verbose=True):
+        row_choice = self._choose(self.row_minima, max)
+        col_choice = self._choose(self.col_minima, max)
+
+        if verbose:
+            if row_choice.strategy is None:
+                print(f"Row Player: All strategies have the same maximin value: {row_choice.value}. No single best option.")
+            else:
+                print(f"Row Player's Maximin Strategy: {row_choice.strategy} (Maximum of Minimum Payoff: {row_choice.value})")
+
+            if col_choice.strategy is None:
+                print(f"Column Player: All strategies have the same maximin value: {col_choice.value}. No single best option.")
+            else:
+                print(f"Column Player's Maximin Strategy: {col_choice.strategy} (Maximum of Minimum Payoff: {col_choice.value})")
+
+        return PlayerPair(row_choice, col_choice)
+
+    @staticmethod
+    def _choose(values, best):
+        # Picks the first strategy with the best value, or None when every strategy ties
+        value = best(values)
+        if all(v == values[0] for v in values):
+            return StrategyChoice(None, value, values)
+        return StrategyChoice(values.index(value), value, values)
+
+    def report(self, verbose=False):
+        """Run every analysis once, sharing the derived arrays between them."""
+        return {
+            'dominance': self.find_strongly_dominated_strategies(verbose),
+            'pure_equilibria': self.find_pure_strategy_equilibria(verbose),
+            'pareto': self.find_pareto_optimal_solutions(verbose),
+            'minimax_regret': self.find_minimax_strategy(verbose),
+            'maximin': self.find_maximin_strategy(verbose),
+        }
 
     def simulate_repeated_play(self, num_rounds, row_strategy, col_strategy):
         row_scores = 0
@@ -294,37 +380,38 @@ def tit_for_tat(num_actions, last_action):
 def always_choose_last_col(num_col_actions, round_num):
     return num_col_actions - 1
 
-file_path = ['prog4A.txt', 'prog4B.txt', 'prog4C.txt']
-game = NormalFormGame.from_file(file_path[2])
-
-game.find_strongly_dominated_strategies()
-print()
-game.iteratively_remove_weakly_dominated_strategies()
-print()
-game.find_pure_strategy_equilibria()
-print()
-game.find_pareto_optimal_solutions()
-print()
-game.find_minimax_strategy()
-print()
-game.find_maximin_strategy()
-print()
-# print("Simulation Strategies with Row = Random and Col = Random:")
-# game.simulate_repeated_play(num_rounds=100, row_strategy=random_row_strategy, col_strategy=random_col_strategy)
-
-# print("\nSimulation Strategies with Row = Random and Col = Always Choose First:")
-# game.simulate_repeated_play(num_rounds=100, row_strategy=random_row_strategy, col_strategy=always_choose_first_col)
-
-# print("\nSimulation Strategies with Row = Random and Col = Always Choose Last:")
-# game.simulate_repeated_play(num_rounds=100, row_strategy=random_row_strategy, col_strategy=always_choose_last_col)
-
-# print("\nSimulation Strategies with Row = Random and Col = Tit for Tat:")
-# game.simulate_repeated_play(num_rounds=100, row_strategy=random_row_strategy, col_strategy=tit_for_tat)
-
-# print("\nSimulation Strategies with Row = Tit for Tat and Col = Always Choose Last:")
-# game.simulate_repeated_play(num_rounds=100, row_strategy=tit_for_tat, col_strategy=always_choose_last_col)
-
-# print("\nSimulation Strategies with Row = Tit for Tat and Col = Tit for Tat:")
-# game.simulate_repeated_play(num_rounds=100, row_strategy=tit_for_tat, col_strategy=tit_for_tat)
-
-# game.display()
\ No newline at end of file
+if __name__ == '__main__':
+    file_path = ['prog4A.txt', 'prog4B.txt', 'prog4C.txt']
+    game = NormalFormGame.from_file(file_path[2])
+
+    game.find_strongly_dominated_strategies()
+    print()
+    game.iteratively_remove_weakly_dominated_strategies()
+    print()
+    game.find_pure_strategy_equilibria()
+    print()
+    game.find_pareto_optimal_solutions()
+    print()
+    game.find_minimax_strategy()
+    print()
+    game.find_maximin_strategy()
+    print()
+    # print("Simulation Strategies with Row = Random and Col = Random:")
+    # game.simulate_repeated_play(num_rounds=100, row_strategy=random_row_strategy, col_strategy=random_col_strategy)
+
+    # print("\nSimulation Strategies with Row = Random and Col = Always Choose First:")
+    # game.simulate_repeated_play(num_rounds=100, row_strategy=random_row_strategy, col_strategy=always_choose_first_col)
+
+    # print("\nSimulation Strategies with Row = Random and Col = Always Choose Last:")
+    # game.simulate_repeated_play(num_rounds=100, row_strategy=random_row_strategy, col_strategy=always_choose_last_col)
+
+    # print("\nSimulation Strategies with Row = Random and Col = Tit for Tat:")
+    # game.simulate_repeated_play(num_rounds=100, row_strategy=random_row_strategy, col_strategy=tit_for_tat)
+
+    # print("\nSimulation Strategies with Row = Tit for Tat and Col = Always Choose Last:")
+    # game.simulate_repeated_play(num_rounds=100, row_strategy=tit_for_tat, col_strategy=always_choose_last_col)
+
+    # print("\nSimulation Strategies with Row = Tit for Tat and Col = Tit for Tat:")
+    # game.simulate_repeated_play(num_rounds=100, row_strategy=tit_for_tat, col_strategy=tit_for_tat)
+
+    # game.display()
\ No newline at end of file
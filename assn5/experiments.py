@@ -0,0 +1,119 @@
+"""
+Monte Carlo comparison of the voting rules in voting.py.
+
+Every election gets its own numpy.random.Generator, spawned from one master seed, so results
+do not depend on how the elections are spread over worker processes.
+
+Example:
+    python experiments.py --elections 2000 --voters 500 --candidates 5 --output results.npz
+"""
+import argparse
+from multiprocessing import Pool, cpu_count
+
+import numpy
+
+from voting import (create_voting, create_clustered_connections, ranked_choice_voting,
+                    perform_social_voting_rounds, calculate_plurality_winner, calculate_borda_winner,
+                    social_welfare)
+
+RULES = ['rcv', 'plurality', 'borda']
+
+
+def run_election(seed, voters, candidates, max_connections=None, num_clusters=None, mode='sequential'):
+    """Runs one election and returns its row of results."""
+    rng = numpy.random.default_rng(seed)
+    ballots, connections = create_voting(voters, candidates, verbose=False, max_connections=max_connections, rng=rng)
+    if num_clusters:
+        connections = create_clustered_connections(voters, candidates, num_clusters, max_connections,
+                                                   rng=rng, verbose=False)
+
+    stabilized, rounds = perform_social_voting_rounds(ballots, connections, mode=mode, verbose=False)
+    winners = {
+        'rcv': ranked_choice_voting(ballots, verbose=False),
+        'plurality': calculate_plurality_winner(stabilized, verbose=False),
+        'borda': calculate_borda_winner(ballots, verbose=False),
+    }
+    cardinal, ordinal = social_welfare(ballots)
+    row = {'rounds': rounds}
+    for rule in RULES:
+        row[rule + '_winner'] = winners[rule]
+        row[rule + '_cardinal'] = cardinal[winners[rule] - 1]
+        row[rule + '_ordinal'] = ordinal[winners[rule] - 1]
+    return row
+
+
+def _run_batch(job):
+    seeds, settings = job
+    return [run_election(seed, **settings) for seed in seeds]
+
+
+def run_experiments(elections, voters, candidates, seed=1052, jobs=None, **settings):
+    """
+    Runs independent elections across a process pool and gathers the results into
+    columnar arrays, one entry per election:
+      <rule>_winner, <rule>_cardinal, <rule>_ordinal for rcv, plurality and borda,
+      rounds (social rounds that changed at least one vote, see voting.run_influence: the run
+        stops when a round changes nothing, when the first choices repeat an earlier state
+        (a cycle), or at the round cap; in sequential mode a round only revisits the voters
+        whose neighbors switched),
+      agree_<rule>_<rule> (True where two rules picked the same winner).
+    """
+    if elections < 1:
+        raise ValueError(f"Need at least one election, got {elections}")
+    seeds = numpy.random.SeedSequence(seed).spawn(elections)
+    settings = dict(settings, voters=voters, candidates=candidates)
+    jobs = jobs or cpu_count()
+    # A few batches per worker keeps the pool balanced without paying per election overhead
+    batches = numpy.array_split(numpy.arange(elections), min(elections, jobs * 4))
+    work = [([seeds[i] for i in batch], settings) for batch in batches if len(batch)]
+
+    if jobs == 1:
+        rows = [row for batch in map(_run_batch, work) for row in batch]
+    else:
+        with Pool(jobs) as pool:
+            rows = [row for batch in pool.map(_run_batch, work) for row in batch]
+
+    results = {key: numpy.array([row[key] for row in rows]) for key in rows[0]}
+    for i, first in enumerate(RULES):
+        for second in RULES[i + 1:]:
+            results[f'agree_{first}_{second}'] = results[first + '_winner'] == results[second + '_winner']
+    return results
+
+
+def print_summary(results):
+    print(f"Elections: {len(results['rounds'])}")
+    print(f"Mean social rounds: {results['rounds'].mean():.2f}")
+    for rule in RULES:
+        print(f"{rule:10s} mean cardinal utility {results[rule + '_cardinal'].mean():10.2f}"
+              f"   mean ordinal utility {results[rule + '_ordinal'].mean():10.2f}")
+    for key in results:
+        if key.startswith('agree_'):
+            print(f"{key}: {results[key].mean() * 100:.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare voting rules over many random elections.")
+    parser.add_argument('--elections', type=int, default=1000)
+    parser.add_argument('--voters', type=int, default=20)
+    parser.add_argument('--candidates', type=int, default=5)
+    parser.add_argument('--max-connections', type=float, default=None,
+                        help="most connections a voter draws (default: voters / 2)")
+    parser.add_argument('--clusters', type=int, default=None, help="use a clustered network with this many clusters")
+    parser.add_argument('--mode', choices=['sequential', 'synchronous'], default='sequential',
+                        help="how voters see each other's switches within a social round")
+    parser.add_argument('--seed', type=int, default=1052)
+    parser.add_argument('--jobs', '-j', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--output', '-o', help="save the result arrays to this .npz file")
+    args = parser.parse_args(argv)
+    if args.elections < 1:
+        parser.error("--elections must be at least 1")
+
+    results = run_experiments(args.elections, args.voters, args.candidates, seed=args.seed, jobs=args.jobs,
+                              max_connections=args.max_connections, num_clusters=args.clusters, mode=args.mode)
+    print_summary(results)
+    if args.output:
+        numpy.savez(args.output, **results)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,220 +1,650 @@
+import heapq
+from collections import namedtuple
+from math import factorial
 
 import numpy
-import copy
 
-CAND = 0  # subscript of list which represents the candidate
-SCORE = 1  # subscript of list which represents the score of the candidate
-PLACE = 2  # subscript of list which represents the ranking, lowest is best
+PERMUTATION_INDEX_LIMIT = 8  # up to this many candidates, rankings are counted in a dense C! table
 
-def print_connections(c, voters, candidates):
+
+class Ballots:
+    """
+    Compact store of every voter's preferences.
+
+    ranks[i][k] is the candidate (numbered from 1) that voter i places in position k, best first.
+    scores[i][c] is the score voter i gives to candidate c + 1.
+    Rules that only read the ballots share these arrays, so no copies are needed between experiments.
+
+    A weighted profile (see compress) has weights[i] identical voters behind row i and no scores;
+    every tallying rule accepts it and gives the same result as the full ballots.
+    """
+
+    def __init__(self, ranks, scores=None, weights=None):
+        self.ranks = numpy.asarray(ranks, dtype=numpy.int16)
+        self.scores = None if scores is None else numpy.asarray(scores, dtype=numpy.float32)
+        self.weights = None if weights is None else numpy.asarray(weights, dtype=numpy.int64)
+
+    @property
+    def voters(self):
+        return self.ranks.shape[0]
+
+    @property
+    def candidates(self):
+        return self.ranks.shape[1]
+
+    @property
+    def total_voters(self):
+        return self.voters if self.weights is None else int(self.weights.sum())
+
+    def places(self):
+        """places[i][c] is the position (1 is best) voter i gives to candidate c + 1."""
+        places = numpy.empty_like(self.ranks)
+        rows = numpy.arange(self.voters)[:, None]
+        places[rows, self.ranks - 1] = numpy.arange(1, self.candidates + 1, dtype=numpy.int16)
+        return places
+
+    def with_ranks(self, ranks):
+        """Ballots with new rankings that share this store's scores."""
+        return Ballots(ranks, self.scores, self.weights)
+
+    def permutation_index(self):
+        """
+        Position of each ranking in the lexicographic order of all rankings (its Lehmer code).
+        The C! rankings only fit an int64 index up to 20 candidates.
+        """
+        if factorial(self.candidates) > numpy.iinfo(numpy.int64).max:
+            raise ValueError(f"Rankings of {self.candidates} candidates do not fit a 64 bit permutation index.")
+        index = numpy.zeros(self.voters, dtype=numpy.int64)
+        for k in range(self.candidates - 1):
+            smaller_later = (self.ranks[:, k + 1:] < self.ranks[:, k, None]).sum(axis=1)
+            index += smaller_later * factorial(self.candidates - 1 - k)
+        return index
+
+    def compress(self):
+        """
+        Collapse identical rankings into one weighted row each. Rows come out in permutation
+        index order. Scores differ between voters with the same ranking, so they are dropped.
+        """
+        if self.candidates <= PERMUTATION_INDEX_LIMIT:
+            # Count straight into a table of all C! rankings, keeping each one's first voter
+            index = self.permutation_index()
+            counts = numpy.bincount(index, weights=self.weights, minlength=factorial(self.candidates))
+            first_voter = numpy.full(len(counts), self.voters)
+            numpy.minimum.at(first_voter, index, numpy.arange(self.voters))
+            present = numpy.flatnonzero(counts)
+            return Ballots(self.ranks[first_voter[present]], weights=counts[present].astype(numpy.int64))
+
+        # Sorting the rows themselves gives the same lexicographic order without the C! sized codes
+        rankings, inverse = numpy.unique(self.ranks, axis=0, return_inverse=True)
+        counts = numpy.bincount(inverse.reshape(-1), weights=self.weights, minlength=len(rankings))
+        return Ballots(rankings, weights=counts.astype(numpy.int64))
+
+    def tally(self, values, minlength):
+        """bincount of values, one entry per voter, counting each row with its weight."""
+        if self.weights is None:
+            return numpy.bincount(values, minlength=minlength)
+        return numpy.bincount(values, weights=self.weights, minlength=minlength).astype(numpy.int64)
+
+
+class SocialNetwork:
+    """
+    Voter social graph in compressed sparse row form.
+
+    The voters connected to voter i are indices[indptr[i]:indptr[i + 1]], in increasing order.
+    Memory grows with the number of connections rather than with voters squared.
+    """
+
+    def __init__(self, indptr, indices):
+        self.indptr = numpy.asarray(indptr, dtype=numpy.int64)
+        self.indices = numpy.asarray(indices, dtype=numpy.int32)
+
+    @classmethod
+    def from_edges(cls, voters, sources, targets):
+        """Build the graph from edge lists, dropping self loops and repeated edges."""
+        sources = numpy.asarray(sources, dtype=numpy.int64)
+        targets = numpy.asarray(targets, dtype=numpy.int64)
+        keep = sources != targets
+        keys = sources[keep] * voters + targets[keep]
+        keys.sort()  # by source, then target
+        if len(keys):
+            keys = keys[numpy.concatenate(([True], keys[1:] != keys[:-1]))]
+        indptr = numpy.zeros(voters + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(keys // voters, minlength=voters), out=indptr[1:])
+        return cls(indptr, keys % voters)
+
+    @property
+    def voters(self):
+        return len(self.indptr) - 1
+
+    def neighbors(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def degrees(self):
+        return numpy.diff(self.indptr)
+
+    def neighbors_of(self, voters):
+        """
+        The neighbor lists of several voters, concatenated. Returns, for every entry, the
+        position in voters it belongs to, and the neighbor itself.
+        """
+        starts, degrees = self.indptr[voters], self.indptr[voters + 1] - self.indptr[voters]
+        owners = numpy.repeat(numpy.arange(len(voters), dtype=numpy.int32), degrees)
+        offsets = numpy.arange(len(owners)) - numpy.repeat(numpy.cumsum(degrees) - degrees, degrees)
+        return owners, self.indices[numpy.repeat(starts, degrees) + offsets]
+
+    def sources(self):
+        """The voter each entry of indices belongs to."""
+        if getattr(self, '_sources', None) is None:
+            self._sources = numpy.repeat(numpy.arange(self.voters, dtype=numpy.int32), self.degrees())
+        return self._sources
+
+    def reverse(self):
+        """The graph with every connection turned around: who lists voter i as a connection."""
+        if getattr(self, '_reverse', None) is None:
+            self._reverse = SocialNetwork.from_edges(self.voters, self.indices, self.sources())
+        return self._reverse
+
+
+def print_connections(network):
     print("CONNECTIONS")
-    for i in range(voters):
+    for i in range(network.voters):
+        row = numpy.zeros(network.voters, dtype=int)
+        row[network.neighbors(i)] = 1
         print(f"Voter {i+1:2d}:", end=" ")
-        for j in range(voters):
-            print(c[i][j], end=" ")
+        for j in range(network.voters):
+            print(row[j], end=" ")
         print()
     print()
 
-def print_rankings(r, voters, candidates, ordered):
+def print_rankings(ballots):
     print("CANDIDATE Rankings")
-    for i in range(voters):
+    places = ballots.places()
+    for i in range(ballots.voters):
         print(f"Voter {i+1:2d}:", end=" ")
-        for j in range(candidates):
-            print(r[i][j], end='')
-        print(" ORDER ", ordered[i])
+        for j in range(ballots.candidates):
+            print(f"[{j + 1}, {ballots.scores[i][j]:.1f}, {places[i][j]}]", end='')
+        print(" ORDER ", ballots.ranks[i].tolist())
     print()
 
 
-def create_voting(voters, candidates):
-    connections = [[0 for _ in range(voters)] for _ in range(voters)]
-    ordered = [[] for _ in range(voters)]
-    numpy.random.seed(1052)
+def create_voting(voters, candidates, verbose=True, max_connections=None, rng=None):
+    """
+    Creates random ballots and a random social network. Each voter draws a number of
+    connections uniformly between 0 and max_connections (voters / 2 by default), so the
+    average degree is about max_connections / 2.
+
+    Without rng the global generator is seeded with 1052 and drawn voter by voter, which
+    reproduces the original elections. With a numpy.random.Generator everything is drawn
+    from that stream at once.
+    """
+    if max_connections is None:
+        max_connections = voters / 2
+
+    if rng is None:
+        counts = []  # connections drawn by each voter
+        targets = [numpy.empty(0, dtype=int)]
+        numpy.random.seed(1052)
+        rng = numpy.random
     
-    for i in range(voters):
-        conn = round(numpy.random.uniform(0, voters / 2))  # random number of connections
-        for _ in range(conn):
-            connectTo = numpy.random.randint(0, voters)
-            if connectTo != i:
-                connections[i][connectTo] = 1
+        for i in range(voters):
+            conn = round(numpy.random.uniform(0, max_connections))  # random number of connections
+            counts.append(conn)
+            targets.append(numpy.random.randint(0, voters, size=conn))
+        targets = numpy.concatenate(targets)
+    else:
+        counts = numpy.round(rng.uniform(0, max_connections, size=voters)).astype(int)
+        targets = rng.integers(0, voters, size=counts.sum())
+    sources = numpy.repeat(numpy.arange(voters), counts)
+    connections = SocialNetwork.from_edges(voters, sources, targets)
             
-    print_connections(connections, voters, candidates)
+    if verbose:
+        print_connections(connections)
 
-    candidateRanking = [[list() for _ in range(candidates)] for _ in range(voters)]
-    for i in range(voters):
-        for j in range(candidates):
-            candidateRanking[i][j] = [j + 1, round(numpy.random.uniform(0, 100)) / 10, 0]
-        
-        sorted_candidates = sorted(candidateRanking[i], reverse=True, key=lambda v: v[SCORE])
-        ordered[i] = [sorted_candidates[k][CAND] for k in range(candidates)]
-        for v in range(candidates):
-            candidate = sorted_candidates[v][CAND] - 1  # candidate index
-            candidateRanking[i][candidate][PLACE] = v + 1
-            
-    print_rankings(candidateRanking, voters, candidates, ordered)
+    # Scores are drawn voter by voter, candidate by candidate, one decimal place
+    scores = (numpy.round(rng.uniform(0, 100, size=(voters, candidates))) / 10).astype(numpy.float32)
+    # Highest score first; the stable sort keeps lower numbered candidates first on a tie
+    ranks = numpy.argsort(-scores, axis=1, kind='stable').astype(numpy.int16) + 1
+    ballots = Ballots(ranks, scores)
+
+    if verbose:
+        print_rankings(ballots)
     
-    return candidateRanking, ordered, connections
+    return ballots, connections
 
 
-def ranked_choice_voting(candidateRanking, ordered, voters, candidates):
-    print("PERFORMING RANKED CHOICE VOTING")
-    remaining_candidates = set(range(1, candidates + 1))
-    
-    while len(remaining_candidates) > 1:
-        first_choice_counts = {cand: 0 for cand in remaining_candidates}
-        last_choice_counts = {cand: 0 for cand in remaining_candidates}
-        
-        for i in range(voters):
-            for rank, candidate in enumerate(ordered[i]):
-                if candidate in remaining_candidates:
-                    if rank == 0:  # First choice
-                        first_choice_counts[candidate] += 1
-                    if rank == len(ordered[i]) - 1:  # Last choice
-                        last_choice_counts[candidate] += 1
-                    break
-        
-        min_first_choice = min(first_choice_counts.values())
-        min_candidates = [cand for cand, count in first_choice_counts.items() if count == min_first_choice]
+class RunoffTally:
+    """
+    Incremental instant-runoff count.
+
+    Each ballot keeps a pointer to its top surviving choice, and each candidate keeps a bucket of
+    the ballots currently counting for them. Eliminating a candidate only moves the ballots in that
+    candidate's bucket, so a whole election costs O(V + C) plus one step per skipped choice.
+    """
+
+    def __init__(self, ranks, weights=None):
+        self.ranks = numpy.ascontiguousarray(ranks)
+        self.weights = weights  # voters behind each ballot row, or None for one each
+        self.candidates = ranks.shape[1]
+        self.remaining = numpy.ones(self.candidates + 1, dtype=bool)  # slot 0 is unused
+        self.remaining[0] = False
+        self.pointer = numpy.zeros(ranks.shape[0], dtype=numpy.int16)  # position of the top surviving choice
+        self.counts = numpy.zeros(self.candidates + 1, dtype=numpy.int64)  # ballots counting for each candidate
+        self.buckets = [[] for _ in range(self.candidates + 1)]  # each bucket is a list of voter index arrays
+        self._add_to_buckets(numpy.arange(ranks.shape[0]))
+
+    def remaining_candidates(self):
+        return numpy.flatnonzero(self.remaining)
+
+    def bucket(self, candidate):
+        """Indices of the voters whose ballot currently counts for candidate."""
+        chunks = self.buckets[candidate]
+        return numpy.concatenate(chunks) if chunks else numpy.empty(0, dtype=numpy.intp)
+
+    def last_choice_votes(self, candidate):
+        """Ballots counting for candidate on which it is also the last surviving choice."""
+        if self.remaining.sum() > 1:
+            return 0  # every ballot ranks all candidates, so its top and last choices differ
+        voters = self.bucket(candidate)
+        surviving = self.remaining[self.ranks[voters]]
+        last = self.candidates - 1 - surviving[:, ::-1].argmax(axis=1)
+        on_last = last == self.pointer[voters]
+        return int(on_last.sum() if self.weights is None else self.weights[voters][on_last].sum())
+
+    def eliminate(self, candidate):
+        """Remove candidate and move its ballots to their next surviving choice."""
+        voters = self.bucket(candidate)
+        self.buckets[candidate] = []
+        self.counts[candidate] = 0
+        self.remaining[candidate] = False
+
+        # Flat positions into the rank matrix; advance only the ballots still on an eliminated candidate
+        position = voters * self.candidates + self.pointer[voters] + 1
+        flat_ranks = self.ranks.ravel()  # a view, since ranks is contiguous
+        moving = numpy.arange(voters.size)
+        while moving.size:
+            moving = moving[~self.remaining[flat_ranks[position[moving]]]]
+            position[moving] += 1
+        self.pointer[voters] = position - voters * self.candidates
+        self._add_to_buckets(voters, flat_ranks[position])
+
+    def _add_to_buckets(self, voters, top=None):
+        if top is None:
+            top = self.ranks[voters, self.pointer[voters]]
+        order = numpy.argsort(top, kind='stable')
+        counts = numpy.bincount(top, minlength=self.candidates + 1)
+        if self.weights is None:
+            self.counts += counts
+        else:
+            self.counts += numpy.bincount(top, weights=self.weights[voters], minlength=self.candidates + 1).astype(numpy.int64)
+        ends = numpy.cumsum(counts)
+        for candidate in numpy.flatnonzero(counts):
+            self.buckets[candidate].append(voters[order[ends[candidate] - counts[candidate]:ends[candidate]]])
+
+
+def ranked_choice_voting(ballots, verbose=True):
+    if verbose:
+        print("PERFORMING RANKED CHOICE VOTING")
+    tally = RunoffTally(ballots.ranks, ballots.weights)
+
+    while len(tally.remaining_candidates()) > 1:
+        remaining_candidates = tally.remaining_candidates()
+        first_choice_counts = tally.counts
+        min_first_choice = first_choice_counts[remaining_candidates].min()
+        min_candidates = [int(cand) for cand in remaining_candidates if first_choice_counts[cand] == min_first_choice]
         
         if len(min_candidates) > 1:
-            print(f"Tie detected among candidates {min_candidates} with {min_first_choice} first-choice votes each.")
+            last_choice_counts = {cand: tally.last_choice_votes(cand) for cand in min_candidates}
             tie_breaker = sorted(min_candidates, key=lambda cand: -last_choice_counts[cand])
             to_eliminate = tie_breaker[0]
-            remaining_candidates.remove(to_eliminate)
-            print(f"Breaking the tie by eliminating candidate {to_eliminate} with the most last-choice votes.")
+            if verbose:
+                print(f"Tie detected among candidates {min_candidates} with {min_first_choice} first-choice votes each.")
+                print(f"Breaking the tie by eliminating candidate {to_eliminate} with the most last-choice votes.")
         else:
             to_eliminate = min_candidates[0]
-            remaining_candidates.remove(to_eliminate)
-            print(f"Eliminating candidate {to_eliminate} with {first_choice_counts[to_eliminate]} first-choice votes.")
-        
-        # Update each voter's preference list to remove the eliminated candidate
-        for i in range(voters):
-            ordered[i] = [cand for cand in ordered[i] if cand != to_eliminate]
+            if verbose:
+                print(f"Eliminating candidate {to_eliminate} with {first_choice_counts[to_eliminate]} first-choice votes.")
+        tally.eliminate(to_eliminate)
     
     # Declare the last remaining candidate as the winner
-    winner = remaining_candidates.pop()
-    print(f"The winner is candidate {winner}!")
+    winner = int(tally.remaining_candidates()[0])
+    if verbose:
+        print(f"The winner is candidate {winner}!")
     return winner
 
 
-def calculate_social_welfare(candidateRanking, ordered, voters, winner):
-    total_cardinal_utility = 0
-    total_ordinal_utility = 0
+def social_welfare(ballots, chunk_size=65536):
+    """
+    Total cardinal and ordinal utility lost for every candidate at once, as two (candidates,)
+    arrays: entry c is what calculate_social_welfare reports for candidate c + 1 as the winner.
+    Voters are processed in chunks to keep the temporary arrays small.
+    """
+    if ballots.scores is None:
+        raise ValueError("Social welfare needs the voters' scores, which a compressed profile does not keep.")
+    cardinal = numpy.zeros(ballots.candidates)
+    ordinal = numpy.zeros(ballots.candidates, dtype=numpy.int64)
+    places = ballots.places()
 
-    print("\nCalculating Social Welfare for the Winner (Candidate {})".format(winner))
-    print("Voter\tCardinal Utility\tOrdinal Utility")
-    
-    for i in range(voters):
-        first_choice = ordered[i][0]  # The voter's first choice
-        # Cardinal utility calculation
-        first_choice_score = candidateRanking[i][first_choice - 1][SCORE]
-        winner_score = candidateRanking[i][winner - 1][SCORE]
-        cardinal_utility = abs(first_choice_score - winner_score)
-        total_cardinal_utility += cardinal_utility
-        
-        # Ordinal utility calculation
-        first_choice_rank = candidateRanking[i][first_choice - 1][PLACE]
-        winner_rank = candidateRanking[i][winner - 1][PLACE]
-        ordinal_utility = abs(first_choice_rank - winner_rank)
-        total_ordinal_utility += ordinal_utility
-        
-        print(f"{i + 1}\t{cardinal_utility:.2f}\t\t\t{ordinal_utility}")
-    
-    print("\nTotal Cardinal Utility (Social Welfare): {:.2f}".format(total_cardinal_utility))
-    print("Total Ordinal Utility (Social Welfare):", total_ordinal_utility,"\n")
+    for start in range(0, ballots.voters, chunk_size):
+        ranks = ballots.ranks[start:start + chunk_size]
+        scores = ballots.scores[start:start + chunk_size].astype(float)
+        chunk_places = places[start:start + chunk_size].astype(numpy.int64)
+        rows = numpy.arange(len(ranks))
+        first_choice = ranks[:, 0] - 1  # The voter's first choice, as a column index
+        cardinal += numpy.abs(scores[rows, first_choice][:, None] - scores).sum(axis=0)
+        ordinal += numpy.abs(chunk_places[rows, first_choice][:, None] - chunk_places).sum(axis=0)
+
+    return cardinal, ordinal
 
 
-def social_network_influence(voters, connections, ordered, candidateRanking):
+def calculate_social_welfare(ballots, winner, verbose=True, voter_report=None):
     """
-    This function calculates how many voters change their votes based on the influence of neighbors.
-    If the voter’s current first choice is not the most popular choice among neighbors, 
-    the voter considers switching to the neighbors' most popular choice.
+    Returns the total cardinal and ordinal utility lost by electing winner.
+    Each voter's utilities are written to voter_report (a path or open file) when it is given.
     """
-    updated_ordered = copy.deepcopy(ordered)
-    changes = 0  # Track how many voters change their first choice
+    if ballots.scores is None:
+        raise ValueError("Social welfare needs the voters' scores, which a compressed profile does not keep.")
+    rows = numpy.arange(ballots.voters)
+    first_choice = ballots.ranks[:, 0] - 1  # The voter's first choice, as a column index
+    scores = ballots.scores.astype(float)
+
+    # Cardinal utility: score gap between the voter's first choice and the winner
+    cardinal_utility = numpy.abs(scores[rows, first_choice] - scores[:, winner - 1])
+    # Ordinal utility: how many places below the voter's first choice the winner is
+    places = ballots.places()
+    ordinal_utility = numpy.abs(places[rows, first_choice].astype(int) - places[:, winner - 1])
+
+    total_cardinal_utility = float(cardinal_utility.sum())
+    total_ordinal_utility = int(ordinal_utility.sum())
+
+    if voter_report is not None:
+        numpy.savetxt(voter_report, numpy.column_stack((rows + 1, cardinal_utility, ordinal_utility)),
+                      fmt=['%d', '%.2f', '%d'], delimiter='\t', header='Voter\tCardinal Utility\tOrdinal Utility',
+                      comments='')
+
+    if verbose:
+        print("\nCalculating Social Welfare for the Winner (Candidate {})".format(winner))
+        print("Total Cardinal Utility (Social Welfare): {:.2f}".format(total_cardinal_utility))
+        print("Total Ordinal Utility (Social Welfare):", total_ordinal_utility,"\n")
 
-    for i in range(voters):
-        neighbors = [j for j in range(voters) if connections[i][j] == 1]
-        if not neighbors:
+    return total_cardinal_utility, total_ordinal_utility
+
+
+def compare_rules(ballots, winners):
+    """
+    Prints the welfare of each rule's winner next to the best possible candidate.
+    winners maps a rule name to the candidate it elected. Returns the social_welfare arrays.
+    """
+    cardinal, ordinal = social_welfare(ballots)
+    best = int(cardinal.argmin()) + 1  # the utilitarian choice loses the least cardinal utility
+
+    print("SOCIAL WELFARE BY VOTING RULE")
+    print(f"{'Rule':24s}{'Winner':>8s}{'Cardinal Utility':>20s}{'Ordinal Utility':>18s}")
+    for rule, winner in list(winners.items()) + [("Utilitarian optimum", best)]:
+        print(f"{rule:24s}{winner:8d}{cardinal[winner - 1]:20.2f}{ordinal[winner - 1]:18d}")
+    print()
+    return cardinal, ordinal
+
+
+def neighbor_choices(connections, top, voters=None):
+    """
+    The most popular current choice among each voter's neighbors, found for all voters at once.
+    Ties go to the choice that appears first in the voter's (sorted) neighbor list.
+    Voters without neighbors keep their own choice.
+    voters, when given, limits the work to those voters; one choice is returned for each.
+    """
+    width = int(top.max()) + 1
+    if voters is None:
+        rows = connections.voters
+        sources = connections.sources()
+        neighbor_top = top[connections.indices]
+        own = top
+    else:
+        rows = len(voters)
+        sources, neighbors = connections.neighbors_of(voters)
+        neighbor_top = top[neighbors]
+        own = top[voters]
+    key_type = numpy.int32 if rows * width < 2 ** 31 else numpy.int64
+    # tally[i][c]: neighbors of voter i currently choosing c (the adjacency times a one-hot choice matrix)
+    keys = sources.astype(key_type) * width + neighbor_top
+    tally = numpy.bincount(keys, minlength=rows * width).reshape(rows, width)
+    best = tally.max(axis=1)
+
+    # The first neighbor (in index order) whose choice has the best count decides the voter
+    winning = numpy.flatnonzero(tally.ravel()[keys] == best[sources])
+    first = numpy.concatenate(([True], sources[winning[1:]] != sources[winning[:-1]])) if len(winning) else []
+    choices = own.copy()
+    choices[sources[winning[first]]] = neighbor_top[winning[first]]
+    return choices
+
+
+def _sequential_sweep(connections, reverse, top, pending, choices):
+    """
+    Visits the voters in pending (sorted) in order, switching each to its neighbors' most popular
+    choice. top is updated in place, so a switch is seen by the voters that follow.
+
+    choices holds, for every voter in pending, the choice computed from the tops at the start of
+    the sweep. It stays valid for a voter until an earlier voter in its neighborhood switches;
+    only then is the voter recomputed.
+
+    Returns the voters that switched, in increasing order, and their previous choices.
+    """
+    voters = len(top)
+    stale = numpy.zeros(voters, dtype=bool)
+    queued = numpy.zeros(voters, dtype=bool)
+    queued[pending] = True
+    pending = list(pending)  # already a heap, since it is sorted
+    changed, previous = [], []
+
+    while pending:
+        i = heapq.heappop(pending)
+        if stale[i]:
+            neighbor_top = top[connections.neighbors(i)]
+            if not len(neighbor_top):
+                continue
+            tally = numpy.bincount(neighbor_top)
+            choice = neighbor_top[tally[neighbor_top] == tally.max()][0]
+        else:
+            choice = choices[i]
+        if choice == top[i]:
             continue
-        
-        neighbor_votes = {}
-        for neighbor in neighbors:
-            top_choice = updated_ordered[neighbor][0]
-            neighbor_votes[top_choice] = neighbor_votes.get(top_choice, 0) + 1
+        previous.append(top[i])
+        top[i] = choice
+        changed.append(i)
 
-        current_first_choice = updated_ordered[i][0]
-        sorted_choices = sorted(neighbor_votes.items(), key=lambda x: -x[1])
-        
-        # Strategy based on the most popular neighbor choice 
-        if sorted_choices and sorted_choices[0][0] != current_first_choice:
-            most_popular_neighbor_choice = sorted_choices[0][0]
-            updated_ordered[i] = [most_popular_neighbor_choice] + \
-                                  [c for c in updated_ordered[i] if c != most_popular_neighbor_choice]
-            changes += 1
+        followers = reverse.neighbors(i)
+        followers = followers[followers > i]
+        stale[followers] = True
+        followers = followers[~queued[followers]]
+        queued[followers] = True
+        for k in followers.tolist():
+            heapq.heappush(pending, k)
+
+    return numpy.array(changed, dtype=numpy.intp), numpy.array(previous, dtype=top.dtype)
+
+
+def social_network_influence(connections, top, mode='sequential'):
+    """
+    This function calculates how many voters change their votes based on the influence of neighbors.
+    If the voter’s current first choice is not the most popular choice among neighbors, 
+    the voter considers switching to the neighbors' most popular choice.
 
-    return updated_ordered, changes
+    top holds every voter's current first choice and is updated in place. Returns the voters
+    that switched, in increasing order.
+    mode='synchronous' lets every voter react to the choices at the start of the round.
+    mode='sequential' visits voters in order, so a switch is seen by the voters that follow
+    in the same round.
+    """
+    choices = neighbor_choices(connections, top)
+    if mode == 'synchronous':
+        changed = numpy.flatnonzero(choices != top)
+        top[changed] = choices[changed]
+        return changed
+    if mode != 'sequential':
+        raise ValueError(f"Unknown influence mode {mode!r}")
+
+    # A voter's sequential choice differs from its synchronous one only when an earlier voter
+    # in its neighborhood switched this round. Those voters are recomputed; the rest are final.
+    pending = numpy.flatnonzero(choices != top)
+    changed, previous = _sequential_sweep(connections, connections.reverse(), top, pending, choices)
+    return changed
+
+
+InfluenceResult = namedtuple('InfluenceResult', [
+    'top',           # every voter's first choice when the run ended
+    'rounds',        # rounds that changed at least one vote
+    'stabilized',    # True when a round passed without any change
+    'cycle_start',   # round after which the state first occurred, when a cycle was found, else None
+    'cycle_period',  # rounds in the cycle, 0 when no cycle was found
+    'cycle_voters',  # voters that switch during the cycle
+    'history',       # (voters, new choices) for each round
+])
+
+
+def run_influence(connections, top, max_rounds=100, mode='sequential'):
+    """
+    Runs social influence rounds until no voter switches, a state repeats, or max_rounds pass.
 
+    In sequential mode the rounds are event driven: after the first round only voters whose
+    neighborhood changed since they were last looked at are visited, so a round costs work in
+    proportion to the switches rather than to the electorate. Synchronous rounds are full
+    vectorized passes.
 
-def perform_social_voting_rounds(voters, connections, ordered, candidateRanking, max_rounds=100):
-    print("SOCIAL NETWORK VOTING")
+    The state after each round is summarized by a 64 bit hash of all first choices, kept up to
+    date from the switches alone. A repeated hash means the dynamics entered a cycle.
+    """
+    if mode not in ('sequential', 'synchronous'):
+        raise ValueError(f"Unknown influence mode {mode!r}")
+    top = top.copy()
+    reverse = connections.reverse() if mode == 'sequential' else None
+    # A dedicated stream, so hashing does not disturb the global generator
+    multipliers = numpy.random.default_rng(1052).integers(0, 2 ** 63, size=len(top), dtype=numpy.uint64)
+    state = int((multipliers * top.astype(numpy.uint64)).sum())
+    seen = {state: 0}
+    history = []
+    stabilized = False
+    cycle_start = None
+
+    choices = neighbor_choices(connections, top)
+    pending = numpy.flatnonzero(choices != top)
     rounds = 0
     while rounds < max_rounds:
-        updated_ordered, changes = social_network_influence(voters, connections, ordered, candidateRanking)
-        
-        if changes == 0:  
-            print(f"\nSystem stabilized after {rounds} rounds.")
-            break
+        if mode == 'sequential':
+            changed, previous = _sequential_sweep(connections, reverse, top, pending, choices)
+        else:
+            changed = numpy.flatnonzero(choices != top)
+            previous = top[changed]
+            top[changed] = choices[changed]
 
+        if not len(changed):
+            stabilized = True
+            break
         rounds += 1
-        ordered = updated_ordered
-        print(f"Round {rounds}: {changes} voters changed their first choice.")
-    
-    if rounds == max_rounds:
-        print("\nMax rounds reached without stabilization. The system did not converge.")
+        history.append((changed, top[changed].copy()))
 
-    return ordered, rounds
+        # Wrapping uint64 arithmetic keeps the hash exact modulo 2**64
+        delta = multipliers[changed] * (top[changed].astype(numpy.uint64) - previous.astype(numpy.uint64))
+        state = (state + int(delta.sum())) % 2 ** 64
+        if state in seen:
+            cycle_start = seen[state]
+            break
+        seen[state] = rounds
+        if mode == 'synchronous':
+            choices = neighbor_choices(connections, top)
+        else:
+            # Every voter after a switch in the sweep already saw it, so only voters before a
+            # switching neighbor can change their mind next round
+            owners, followers = reverse.neighbors_of(changed)
+            pending = numpy.unique(followers[followers < changed[owners]])
+            choices[pending] = neighbor_choices(connections, top, pending)
+            pending = pending[choices[pending] != top[pending]]
+
+    if cycle_start is None:
+        cycle_period, cycle_voters = 0, numpy.empty(0, dtype=numpy.intp)
+    else:
+        cycle_period = rounds - cycle_start
+        cycle_voters = numpy.unique(numpy.concatenate([voters for voters, _ in history[cycle_start:]]))
+    return InfluenceResult(top, rounds, stabilized, cycle_start, cycle_period, cycle_voters, history)
+
+
+def move_to_front(ranks, voters, choices):
+    """Move choices[k] to the front of voter voters[k]'s ranking, keeping the rest in order."""
+    rows = ranks[voters]
+    positions = numpy.argmax(rows == choices[:, None], axis=1)[:, None]
+    k = numpy.arange(ranks.shape[1])
+    source = numpy.where(k == 0, positions, numpy.where(k <= positions, k - 1, k))
+    ranks[voters] = numpy.take_along_axis(rows, source, axis=1)
+
+
+def perform_social_voting_rounds(ballots, connections, max_rounds=100, mode='sequential', verbose=True):
+    if verbose:
+        print("SOCIAL NETWORK VOTING")
+    ranks = ballots.ranks.copy()  # the only copy; switched voters are updated in place
+    result = run_influence(connections, ranks[:, 0], max_rounds, mode)
+
+    for rounds, (changed, choices) in enumerate(result.history, start=1):
+        move_to_front(ranks, changed, choices)
+        if verbose:
+            print(f"Round {rounds}: {len(changed)} voters changed their first choice.")
+
+    if verbose:
+        if result.stabilized:
+            print(f"\nSystem stabilized after {result.rounds} rounds.")
+        elif result.cycle_period:
+            print(f"\nThe system entered a cycle of period {result.cycle_period} after round {result.cycle_start}, "
+                  f"with {len(result.cycle_voters)} voters switching back and forth. It will not converge.")
+        else:
+            print("\nMax rounds reached without stabilization. The system did not converge.")
 
+    return ballots.with_ranks(ranks), result.rounds
 
-def calculate_plurality_winner(ordered, candidates):
-    vote_counts = {c: 0 for c in range(1, candidates + 1)}
-    for pref in ordered:
-        vote_counts[pref[0]] += 1
 
-    winner = max(vote_counts, key=vote_counts.get)
-    print(f"\nPlurality Winner after Stabilization: Candidate {winner}")
-    return winner
+def calculate_plurality_winner(ballots, verbose=True):
+    vote_counts = ballots.tally(ballots.ranks[:, 0], ballots.candidates + 1)[1:]
 
+    winner = int(vote_counts.argmax()) + 1
+    if verbose:
+        print(f"\nPlurality Winner after Stabilization: Candidate {winner}")
+    return winner
 
-def calculate_borda_winner(candidateRanking, voters, candidates):
-    # Initialize a dictionary to hold Borda scores for each candidate
-    print("SIMULATION WITH BORDA")
-    borda_scores = {c: 0 for c in range(1, candidates + 1)}
 
-    for i in range(voters):
-        for candidate, ranking in enumerate(candidateRanking[i]):
-            cand_index = ranking[CAND]  # Candidate ID (1-based index)
-            position = ranking[PLACE] - 1  # Borda points, zero-indexed rank
-            borda_scores[cand_index] += (candidates - 1 - position)
+def calculate_borda_winner(ballots, verbose=True):
+    voters, candidates = ballots.voters, ballots.candidates
+    # The candidate in position k earns candidates - 1 - k points from that voter
+    points = numpy.tile(numpy.arange(candidates - 1, -1, -1), voters)
+    if ballots.weights is not None:
+        points = points * numpy.repeat(ballots.weights, candidates)
+    borda_scores = numpy.bincount(ballots.ranks.ravel(), weights=points, minlength=candidates + 1)[1:].astype(numpy.int64)
 
-    winner = max(borda_scores, key=borda_scores.get)
+    winner = int(borda_scores.argmax()) + 1
     
-    print("\nBorda Scores:")
-    for candidate, score in borda_scores.items():
-        print(f"Candidate {candidate}: {score} points")
+    if verbose:
+        print("SIMULATION WITH BORDA")
+        print("\nBorda Scores:")
+        for candidate, score in enumerate(borda_scores, start=1):
+            print(f"Candidate {candidate}: {score} points")
 
-    print(f"\nBorda Winner: Candidate {winner}")
+        print(f"\nBorda Winner: Candidate {winner}")
     return winner
 
 
-def create_clustered_connections(voters, candidates, num_clusters=5):
+def create_clustered_connections(voters, candidates, num_clusters=5, max_connections=None, rng=None, verbose=True):
     """
     Creates a clustered social network, where voters are divided into a set number of 
     clusters. Each voter is more likely to connect with others in their cluster, 
-    simulating real-world social groups.
+    simulating real-world social groups. Each voter draws up to max_connections
+    (cluster size / 2 by default) connections inside its cluster.
+    Seeding works as in create_voting.
     """
-    print("SIMULATION WITH CLUSTERED CONNECTIONS\n")
-    connections = [[0 for _ in range(voters)] for _ in range(voters)]
+    if verbose:
+        print("SIMULATION WITH CLUSTERED CONNECTIONS\n")
     cluster_size = voters // num_clusters
+    if max_connections is None:
+        max_connections = cluster_size / 2
+    if rng is not None:
+        return _draw_clustered_connections(voters, num_clusters, cluster_size, max_connections, rng)
+    owners = []  # voter drawing each batch of targets
+    counts = []  # size of each batch
+    targets = [numpy.empty(0, dtype=int)]
 
     numpy.random.seed(1052)
     for cluster in range(num_clusters):
@@ -223,48 +653,63 @@ def create_clustered_connections(voters, candidates, num_clusters=5):
 
         # Connect within the cluster
         for i in range(cluster_start, cluster_end):
-            num_connections = round(numpy.random.uniform(0, cluster_size / 2))
-            for _ in range(num_connections):
-                connect_to = numpy.random.randint(cluster_start, cluster_end)
-                if connect_to != i:
-                    connections[i][connect_to] = 1
+            num_connections = round(numpy.random.uniform(0, max_connections))
+            owners.append(i)
+            counts.append(num_connections)
+            targets.append(numpy.random.randint(cluster_start, cluster_end, size=num_connections))
 
         # Optional: Add a few random connections outside the cluster for realism
         for i in range(cluster_start, cluster_end):
             if numpy.random.random() < 0.2:  # 20% chance to connect outside the cluster
-                connect_to = numpy.random.randint(0, voters)
-                if connect_to != i:
-                    connections[i][connect_to] = 1
+                owners.append(i)
+                counts.append(1)
+                targets.append(numpy.array([numpy.random.randint(0, voters)]))
 
-    return connections
+    sources = numpy.repeat(numpy.array(owners, dtype=int), counts)
+    return SocialNetwork.from_edges(voters, sources, numpy.concatenate(targets))
+
+
+def _draw_clustered_connections(voters, num_clusters, cluster_size, max_connections, rng):
+    # Same model as create_clustered_connections, drawn from rng for all voters at once
+    clustered = num_clusters * cluster_size  # voters past the last full cluster draw nothing
+    cluster_start = numpy.arange(clustered) // cluster_size * cluster_size if cluster_size else numpy.empty(0, dtype=int)
+    counts = numpy.round(rng.uniform(0, max_connections, size=clustered)).astype(int)
+    inside = numpy.repeat(cluster_start, counts) + rng.integers(0, max(cluster_size, 1), size=counts.sum())
+    outside = numpy.flatnonzero(rng.random(clustered) < 0.2)  # 20% chance to connect outside the cluster
+    sources = numpy.concatenate((numpy.repeat(numpy.arange(clustered), counts), outside))
+    targets = numpy.concatenate((inside, rng.integers(0, voters, size=len(outside))))
+    return SocialNetwork.from_edges(voters, sources, targets)
 
 
 if __name__ == '__main__':
     voters = 20
     candidates = 5
     num_clusters = 5
-    candidateRanking, ordered, connections = create_voting(voters, candidates)
+    ballots, connections = create_voting(voters, candidates)
    
     # Part 1 with out of Ranked Choice Voting winner and the social welfare for that outcome
-    winner = ranked_choice_voting(copy.deepcopy(candidateRanking), copy.deepcopy(ordered), voters, candidates)
-    calculate_social_welfare(candidateRanking, ordered, voters, winner)
+    winner = ranked_choice_voting(ballots)
+    calculate_social_welfare(ballots, winner)
     print("\n")
 
     # PART 2: Simulate social network model and strategic voting
-    stabilized_ordered, total_rounds = perform_social_voting_rounds(voters, connections, copy.deepcopy(ordered), copy.deepcopy(candidateRanking))
-    plurality_winner = calculate_plurality_winner(stabilized_ordered, candidates)
-    calculate_social_welfare(candidateRanking, ordered, voters, plurality_winner)
+    stabilized_ballots, total_rounds = perform_social_voting_rounds(ballots, connections)
+    plurality_winner = calculate_plurality_winner(stabilized_ballots)
+    calculate_social_welfare(ballots, plurality_winner)
     print("\n")
 
     # Extra: Calculate Borda winner
-    borda_winner = calculate_borda_winner(candidateRanking, voters, candidates)
-    calculate_social_welfare(candidateRanking, ordered, voters, borda_winner)
+    borda_winner = calculate_borda_winner(ballots)
+    calculate_social_welfare(ballots, borda_winner)
     print("\n")
 
     # Extra: Clustered Connection Simulation for Social Voting
     clustered_connections = create_clustered_connections(voters, candidates, num_clusters)
-    clustered_stabilized_ordered, clustered_total_rounds = perform_social_voting_rounds(
-        voters, clustered_connections, copy.deepcopy(ordered), copy.deepcopy(candidateRanking)
-    )
-    clustered_plurality_winner = calculate_plurality_winner(clustered_stabilized_ordered, candidates)
-    calculate_social_welfare(candidateRanking, ordered, voters, clustered_plurality_winner)
+    clustered_stabilized_ballots, clustered_total_rounds = perform_social_voting_rounds(ballots, clustered_connections)
+    clustered_plurality_winner = calculate_plurality_winner(clustered_stabilized_ballots)
+    calculate_social_welfare(ballots, clustered_plurality_winner)
+    print("\n")
+
+    compare_rules(ballots, {"Ranked choice": winner, "Plurality": plurality_winner, "Borda": borda_winner,
+                            "Clustered plurality": clustered_plurality_winner})
+
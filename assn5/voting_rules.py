@@ -0,0 +1,135 @@
+"""
+Voting rules built on one shared pass over the ballots.
+
+The pairwise preference matrix is computed once per election; Condorcet, Copeland, Schulze,
+minimax and Borda are all read off it, so adding a rule does not add another scan of the
+ballots. Candidates are numbered from 1, as in voting.py.
+"""
+import numpy
+
+from voting import create_voting
+
+
+def pairwise_preferences(ballots, chunk_size=65536):
+    """
+    pairwise[a][b] is the number of voters that rank candidate a + 1 above candidate b + 1.
+    One O(V * C^2) pass over the place matrix, done in voter chunks. Weighted rows
+    (from Ballots.compress) count once per voter they stand for.
+    """
+    candidates = ballots.candidates
+    pairwise = numpy.zeros((candidates, candidates), dtype=numpy.int64)
+    places = ballots.places()
+    for start in range(0, ballots.voters, chunk_size):
+        chunk = places[start:start + chunk_size]
+        for a in range(candidates):
+            above = chunk[:, a, None] < chunk
+            if ballots.weights is None:
+                pairwise[a] += above.sum(axis=0)
+            else:
+                pairwise[a] += ballots.weights[start:start + chunk_size] @ above
+    return pairwise
+
+
+class Election:
+    """
+    Ballots plus the shared tallies every rule reads. The pairwise matrix and the first
+    choice counts are computed the first time a rule needs them.
+    """
+
+    def __init__(self, ballots):
+        self.ballots = ballots
+        self._pairwise = None
+        self._first_choices = None
+
+    @property
+    def pairwise(self):
+        if self._pairwise is None:
+            self._pairwise = pairwise_preferences(self.ballots)
+        return self._pairwise
+
+    @property
+    def first_choices(self):
+        if self._first_choices is None:
+            self._first_choices = self.ballots.tally(self.ballots.ranks[:, 0] - 1, self.ballots.candidates)
+        return self._first_choices
+
+    @property
+    def beats(self):
+        """beats[a][b] is True when a majority prefers candidate a + 1 to candidate b + 1."""
+        return self.pairwise > self.pairwise.T
+
+    def winner(self, rule, **options):
+        return RULES[rule](self, **options)
+
+
+def condorcet_winner(election):
+    """The candidate who beats every other candidate head to head, or None."""
+    winners = numpy.flatnonzero(election.beats.sum(axis=1) == election.ballots.candidates - 1)
+    return int(winners[0]) + 1 if len(winners) else None
+
+
+def copeland_winner(election):
+    """Most pairwise wins, with a tie counting as half a win."""
+    beats = election.beats
+    ties = (election.pairwise == election.pairwise.T) & ~numpy.eye(len(beats), dtype=bool)
+    scores = beats.sum(axis=1) + 0.5 * ties.sum(axis=1)
+    return int(scores.argmax()) + 1
+
+
+def schulze_winner(election):
+    """Strongest beatpaths found with Floyd-Warshall over the pairwise matrix."""
+    pairwise = election.pairwise
+    strength = numpy.where(pairwise > pairwise.T, pairwise, 0)
+    for k in range(len(strength)):
+        strength = numpy.maximum(strength, numpy.minimum(strength[:, k, None], strength[None, k, :]))
+    # A winner's strongest path to every rival is at least as strong as the path back
+    unbeaten = (strength >= strength.T).all(axis=1)
+    return int(numpy.flatnonzero(unbeaten)[0]) + 1
+
+
+def minimax_winner(election):
+    """The candidate whose largest pairwise opposition is smallest."""
+    opposition = election.pairwise.T.copy()  # opposition[a][b]: voters preferring b + 1 to a + 1
+    numpy.fill_diagonal(opposition, 0)
+    return int(opposition.max(axis=1).argmin()) + 1
+
+
+def borda_winner(election):
+    """Borda points equal the number of rivals each voter ranks a candidate above."""
+    return int(election.pairwise.sum(axis=1).argmax()) + 1
+
+
+def plurality_winner(election):
+    return int(election.first_choices.argmax()) + 1
+
+
+def approval_winner(election, threshold=5.0):
+    """
+    Each voter approves every candidate scored at least threshold; most approvals wins.
+    Needs the voters' scores, so it does not run on a compressed profile.
+    """
+    if election.ballots.scores is None:
+        raise ValueError("Approval voting needs the voters' scores, which a compressed profile does not keep.")
+    approvals = (election.ballots.scores >= threshold).sum(axis=0)
+    return int(approvals.argmax()) + 1
+
+
+# Rule name -> function taking an Election; register new rules here
+RULES = {
+    'plurality': plurality_winner,
+    'borda': borda_winner,
+    'condorcet': condorcet_winner,
+    'copeland': copeland_winner,
+    'schulze': schulze_winner,
+    'minimax': minimax_winner,
+    'approval': approval_winner,
+}
+
+
+if __name__ == '__main__':
+    ballots, connections = create_voting(20, 5, verbose=False)
+    election = Election(ballots)
+    print("Pairwise preferences (row candidate over column candidate):")
+    print(election.pairwise)
+    for rule in RULES:
+        print(f"{rule.capitalize()} winner: {election.winner(rule)}")